@@ -0,0 +1,128 @@
+import os
+import re
+import logging
+import hashlib
+
+from publisher import publish
+
+logger = logging.getLogger(__name__)
+
+# Files named <stem>.<16 hex digits>.<ext> never change and can be cached forever
+HASHED_NAME = re.compile(r"\.[0-9a-f]{16}\.[A-Za-z0-9]+$")
+
+
+def minify_css(text):
+    """
+    Returns the CSS without comments and without the whitespace that carries no meaning.
+    """
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text):
+    """
+    Returns the JavaScript without comments, indentation and blank lines.
+
+    The line breaks are kept, so the automatic semicolon insertion is not affected.
+    A trailing // comment is only dropped if no string is open before it.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("//"):
+            continue
+        code, separator, _ = line.partition(" //")
+        if separator and all(code.count(quote) % 2 == 0 for quote in "'\"`"):
+            line = code.rstrip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+class AssetPipeline:
+    """
+    A class used to publish the static assets of a page as content-hashed files.
+
+    Each asset is minified (CSS and JavaScript), named after the hash of its content,
+    e.g. styles.3f2a9c0d1b4e5f60.css, and written to the asset directory. A changed
+    asset gets a new name, so the files can be cached indefinitely and a refresh of
+    the page only transfers the HTML body.
+    """
+
+    def __init__(self, asset_dir, page_dir, precompress=()):
+        """
+        Initializes the AssetPipeline object.
+
+        Args:
+            asset_dir (str): The directory the hashed files are written to.
+            page_dir (str): The directory of the page, the URLs are relative to it.
+            precompress (iterable, optional): Encodings ("gz", "br") of precompressed
+                copies written next to the minified CSS and JavaScript files.
+        """
+        self.asset_dir = asset_dir
+        self.page_dir = page_dir
+        self.precompress = tuple(precompress)
+        self._urls = {}
+
+    def build(self, source_path):
+        """
+        Minifies an asset and publishes it under its content-hashed name.
+
+        Args:
+            source_path (str): The path of the source file.
+
+        Returns:
+            str: The path of the hashed file.
+        """
+        stem, extension = os.path.splitext(os.path.basename(source_path))
+        with open(source_path, "rb") as f:
+            data = f.read()
+        minifier = MINIFIERS.get(extension.lower())
+        if minifier is not None:
+            data = minifier(data.decode("utf-8")).encode("utf-8")
+
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        path = os.path.join(self.asset_dir, f"{stem}.{digest}{extension}")
+        if not os.path.exists(path):
+            os.makedirs(self.asset_dir, exist_ok=True)
+            publish(path, (data,), self.precompress if minifier is not None else ())
+            logger.info("Asset %s published as %s", source_path, path)
+        return path
+
+    def url(self, source_path):
+        """
+        Returns the URL of the hashed file of an asset, relative to the page.
+
+        The asset is only built again when the mtime of its source changes. A source
+        that does not exist, e.g. a URL, is returned as it is.
+
+        Args:
+            source_path (str): The path of the source file.
+
+        Returns:
+            str: The URL to reference the asset with.
+        """
+        if not source_path:
+            return source_path
+        try:
+            mtime = os.stat(source_path).st_mtime_ns
+        except OSError:
+            return source_path
+
+        cached = self._urls.get(source_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            path = self.build(source_path)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("Asset %s could not be built: %s", source_path, e)
+            return source_path
+        url = os.path.relpath(path, self.page_dir).replace(os.sep, "/")
+        self._urls[source_path] = (mtime, url)
+        return url
@@ -0,0 +1,119 @@
+"""
+Benchmarks the fetch layer of ImportApiData end-to-end against the local mock API,
+including its timeouts, retries and conditional requests.
+
+Usage:
+python bench/bench_fetch.py [--scenario all|ok|conditional|latency|throttled|
+                                        rate_limited|truncated|malformed|errors]
+                            [--fetches 20] [--clients 1] [--timeout 2] [--retries 3]
+                            [--entries 1000]
+
+A scenario sets some faults of the mock API, the other options of bench/mockapi.py
+apply as given, e.g. --scenario ok --latency 3 to hit the client timeout. Every client uses its own ImportApiData, so its session,
+connection pool and validators, like one notdienst process.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from lxml import etree
+
+from importapidata import ImportApiData
+from mockapi import add_arguments, from_arguments
+
+SCENARIOS = {
+    "ok": {"no_conditional": True},
+    "conditional": {},
+    "latency": {"no_conditional": True, "latency": 0.2, "jitter": 0.1},
+    "throttled": {"no_conditional": True, "bandwidth": 200000},
+    "rate_limited": {"no_conditional": True, "rate_limit": 5},
+    "truncated": {"no_conditional": True, "truncate_rate": 0.3},
+    "malformed": {"no_conditional": True, "malformed_rate": 0.3},
+    "errors": {"no_conditional": True, "error_every": 10, "error_burst": 3},
+}
+
+
+def fetch_once(importer):
+    """
+    Fetches and parses the feed once.
+
+    Returns:
+        tuple: The outcome ("ok", "not modified", "failed" or "parse error") and the seconds.
+    """
+    start = time.perf_counter()
+    xml_data = importer.fetch()
+    outcome = "not modified" if xml_data is None else "failed" if not xml_data else "ok"
+    if outcome == "ok":
+        try:
+            sum(1 for _ in importer.iter_entries(xml_data))
+        except etree.XMLSyntaxError:
+            outcome = "parse error"
+    return outcome, time.perf_counter() - start
+
+
+def run_client(url, args):
+    """
+    Runs the fetches of one client.
+    """
+    importer = ImportApiData(url, timeout=args.timeout, retries=args.retries)
+    return [fetch_once(importer) for _ in range(args.fetches)]
+
+
+def run_scenario(name, args):
+    """
+    Runs one scenario against a fresh mock API and prints its results.
+    """
+    for option, value in SCENARIOS[name].items():
+        setattr(args, option, value)
+    mock = from_arguments(args, port=0).start()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            results = [result for client in executor.map(lambda _: run_client(mock.url, args),
+                                                         range(args.clients))
+                       for result in client]
+        elapsed = time.perf_counter() - start
+    finally:
+        mock.stop()
+
+    latencies = sorted(seconds for _, seconds in results)
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:>12}: {len(results) / elapsed:7.1f} fetches/s, "
+          f"median {statistics.median(latencies) * 1000:7.1f} ms, p95 {p95 * 1000:7.1f} ms, "
+          f"max {latencies[-1] * 1000:7.1f} ms")
+    print(f"{'':>12}  client: {outcomes}")
+    print(f"{'':>12}  server: {mock.requests} requests {mock.status_counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ImportApiData against the mock API.")
+    parser.add_argument("--scenario", default="all", choices=["all", *SCENARIOS])
+    parser.add_argument("--fetches", type=int, default=20, help="Fetches per client.")
+    parser.add_argument("--clients", type=int, default=1, help="Concurrent clients.")
+    parser.add_argument("--timeout", type=float, default=2.0, help="The API_TIMEOUT of the clients.")
+    parser.add_argument("--retries", type=int, default=3, help="The retries of the clients.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.seed is None:
+        args.seed = 1
+    # The failures are counted per outcome, so the log of every single one is not needed
+    logging.getLogger("importapidata").setLevel(logging.CRITICAL)
+
+    defaults = vars(args).copy()
+    for name in (SCENARIOS if args.scenario == "all" else [args.scenario]):
+        run_scenario(name, argparse.Namespace(**defaults))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Compares the grid index of SpatialIndex with the full vectorized scan of
+nearest_pharmacies for many display origins.
+
+Usage:
+python bench/bench_geo.py [entry_count] [origin_count] [k] [radius_km]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from importapidata import ImportApiData
+from geo import nearest_pharmacies
+from spatialindex import SpatialIndex
+from synthfeed import build_feed
+
+
+def main():
+    entry_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    origin_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    radius_km = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+
+    pharmacy_list = list(ImportApiData.iter_entries(build_feed(entry_count)))
+    rng = random.Random(1)
+    # The origins are spread over the area of the entries
+    lats = [pharmacy.lat for pharmacy in pharmacy_list]
+    lons = [pharmacy.lon for pharmacy in pharmacy_list]
+    origins = [(rng.uniform(min(lats), max(lats)), rng.uniform(min(lons), max(lons)))
+               for _ in range(origin_count)]
+
+    start = time.perf_counter()
+    scanned = [nearest_pharmacies(pharmacy_list, lat, lon, max_rows=k) for lat, lon in origins]
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SpatialIndex(pharmacy_list)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nearest = index.nearest_many(origins, k)
+    nearest_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    within = index.within_many(origins, radius_km)
+    within_seconds = time.perf_counter() - start
+
+    matches = sum([p.id for p in a] == [p.id for p in b] for a, b in zip(scanned, nearest))
+    print(f"{entry_count} entries, {origin_count} origins, {len(index.cells)} grid cells")
+    print(f"  full scan, {k} nearest:  {scan_seconds * 1000:8.1f} ms")
+    print(f"  grid build:             {build_seconds * 1000:8.1f} ms")
+    print(f"  grid, {k} nearest:       {nearest_seconds * 1000:8.1f} ms "
+          f"({matches}/{origin_count} identical to the full scan)")
+    print(f"  grid, within {radius_km:g} km:   {within_seconds * 1000:8.1f} ms "
+          f"({sum(map(len, within)) / origin_count:.1f} pharmacies per origin)")
+
+
+if __name__ == "__main__":
+    main()
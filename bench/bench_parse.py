@@ -0,0 +1,127 @@
+"""
+Compares the streaming entry parser of ImportApiData with the former
+build-the-whole-tree parser on a synthetic feed.
+
+Usage:
+python bench/bench_parse.py [entry_count]
+
+Each parser runs in its own subprocess, so the reported peak RSS is not
+polluted by the other one.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from lxml import etree
+
+from importapidata import ImportApiData
+from synthfeed import build_feed
+
+
+def legacy_parse(xml_data, xml_file):
+    """
+    The parser used before iterparse: full tree, pretty-printed twice, one find() per field.
+    """
+    xml_root = etree.fromstring(xml_data)
+    with open(xml_file, "wb") as f:
+        f.write(etree.tostring(xml_root, pretty_print=True, encoding='utf-8'))
+    etree.tostring(xml_root, pretty_print=True).decode()
+
+    pharmacy_list = []
+    for entry_element in xml_root.findall(".//entries/entry"):
+        pharmacy_list.append({
+            "id": entry_element.find("id").text,
+            "from": entry_element.find("from").text,
+            "to": entry_element.find("to").text,
+            "name": entry_element.find("name").text,
+            "street": entry_element.find("street").text,
+            "zipCode": entry_element.find("zipCode").text,
+            "location": entry_element.find("location").text,
+            "subLocation": entry_element.find("subLocation").text,
+            "phone": entry_element.find("phone").text,
+            "lat": float(entry_element.find("lat").text),
+            "lon": float(entry_element.find("lon").text),
+        })
+    return pharmacy_list
+
+
+def streaming_parse(xml_data, xml_file):
+    """
+    The current parser: raw bytes to disk, entries streamed with iterparse.
+    """
+    importer = ImportApiData(None)
+    importer.save_xml_to_file(xml_data, xml_file)
+    return list(importer.iter_entries(xml_data))
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident set size of this process in kB.
+
+    /proc/self/status is preferred, because ru_maxrss survives the exec of the
+    benchmark subprocess and would report the peak of the parent.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_one(parser_name, feed_file):
+    """
+    Runs one parser on the feed file and prints its result as JSON.
+    """
+    with open(feed_file, "rb") as f:
+        xml_data = f.read()
+    baseline_rss = peak_rss_kb()
+
+    parser = {"legacy": legacy_parse, "streaming": streaming_parse}[parser_name]
+    start = time.perf_counter()
+    pharmacy_list = parser(xml_data, feed_file + ".out")
+    elapsed = time.perf_counter() - start
+
+    peak_rss = peak_rss_kb()
+    print(json.dumps({
+        "parser": parser_name,
+        "entries": len(pharmacy_list),
+        "seconds": elapsed,
+        "peak_rss_kb": peak_rss,
+        "parse_rss_kb": peak_rss - baseline_rss,
+    }))
+
+
+def main():
+    entry_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        feed_file = os.path.join(tmp_dir, "feed.xml")
+        with open(feed_file, "wb") as f:
+            f.write(build_feed(entry_count))
+        print(f"Synthetic feed: {entry_count} entries, {os.path.getsize(feed_file) / 1e6:.1f} MB")
+
+        for parser_name in ("legacy", "streaming"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", parser_name, feed_file],
+                check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['parser']:>10}: {result['seconds'] * 1000:8.1f} ms, "
+                  f"+{result['parse_rss_kb'] / 1024:6.1f} MB RSS "
+                  f"(peak {result['peak_rss_kb'] / 1024:.1f} MB), {result['entries']} entries")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        run_one(sys.argv[2], sys.argv[3])
+    else:
+        main()
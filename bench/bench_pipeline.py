@@ -0,0 +1,196 @@
+"""
+Benchmarks the parse, format and render stages of the pipeline on synthetic
+feeds and compares the results with a stored baseline.
+
+Usage:
+python bench/bench_pipeline.py [--sizes 10,100,1000,10000,100000] [--repeat 3]
+                               [--baseline bench/baseline.json] [--threshold 0.2]
+                               [--save-baseline]
+
+Every feed size runs in its own subprocess, so the reported peak RSS belongs to
+that size alone. The stages are:
+
+parse:  ImportApiData.import_data() with TEST_MODE/TEST_XML_FILE
+format: the from/to datetime formatting of every entry
+render: HtmlCreator.create_html() with the page template
+
+The median latency of the repeats is compared with the baseline. The exit code
+is 1 if a stage got slower, or the peak RSS grew, by more than the threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from importapidata import ImportApiData
+from htmlcreator import HtmlCreator
+from synthfeed import build_feed
+from bench_parse import peak_rss_kb
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HTML_TEMPLATE = os.path.join(REPO_DIR, "templates", "template.html")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("parse", "format", "render")
+
+
+def format_entries(pharmacy_list):
+    """
+    Formats the from/to datetimes of every entry, as the page does.
+    """
+    for pharmacy in pharmacy_list:
+        # The formatted values are cached per record, so start from scratch
+        pharmacy._from_text = pharmacy._to_text = None
+        pharmacy.from_text
+        pharmacy.to_text
+
+
+def run_size(feed_file, repeat):
+    """
+    Runs all stages on a synthetic feed file and returns the results.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["TEST_MODE"] = "True"
+        os.environ["TEST_XML_FILE"] = feed_file
+
+        importer = ImportApiData(None, xml_file=os.path.join(tmp_dir, "data.xml"))
+        html_creator = HtmlCreator(os.path.join(tmp_dir, "index.html"), "Benchmark", "", "",
+                                   HTML_TEMPLATE, template_cache_dir=os.path.join(tmp_dir, "cache"))
+        # Compile the template once, so the first render does not pay for it
+        html_creator.create_html([])
+
+        timings = {stage: [] for stage in STAGES}
+        html_bytes = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pharmacy_list = importer.import_data()
+            timings["parse"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            format_entries(pharmacy_list)
+            timings["format"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            html_bytes = len(html_creator.create_html(pharmacy_list).encode("utf-8"))
+            timings["render"].append(time.perf_counter() - start)
+
+        return {
+            "entries": len(pharmacy_list),
+            "feed_bytes": os.path.getsize(feed_file),
+            "html_bytes": html_bytes,
+            "peak_rss_kb": peak_rss_kb(),
+            "stages": {
+                stage: {
+                    "median_seconds": statistics.median(values),
+                    "min_seconds": min(values),
+                    "entries_per_second": len(pharmacy_list) / statistics.median(values)
+                    if statistics.median(values) > 0 else None,
+                }
+                for stage, values in timings.items()
+            },
+        }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the results with the baseline.
+
+    Returns:
+        list: A description of every regression beyond the threshold.
+    """
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            continue
+        for stage in STAGES:
+            current = result["stages"][stage]["median_seconds"]
+            previous = base["stages"][stage]["median_seconds"]
+            if previous > 0 and current > previous * (1 + threshold):
+                regressions.append(f"{size} entries, {stage}: {previous * 1000:.1f} ms -> "
+                                   f"{current * 1000:.1f} ms (+{(current / previous - 1) * 100:.0f}%)")
+        if result["peak_rss_kb"] > base["peak_rss_kb"] * (1 + threshold):
+            regressions.append(f"{size} entries, peak RSS: {base['peak_rss_kb'] / 1024:.1f} MB -> "
+                               f"{result['peak_rss_kb'] / 1024:.1f} MB")
+    return regressions
+
+
+def print_result(size, result, base=None):
+    """
+    Prints the result of one feed size, with the change against the baseline.
+    """
+    print(f"{size} entries ({result['feed_bytes'] / 1e6:.2f} MB XML, "
+          f"{result['html_bytes'] / 1e6:.2f} MB HTML), peak RSS {result['peak_rss_kb'] / 1024:.1f} MB")
+    for stage in STAGES:
+        values = result["stages"][stage]
+        line = (f"  {stage:>7}: {values['median_seconds'] * 1000:9.2f} ms median, "
+                f"{values['min_seconds'] * 1000:9.2f} ms min")
+        if values["entries_per_second"]:
+            line += f", {values['entries_per_second']:12,.0f} entries/s"
+        if base is not None:
+            previous = base["stages"][stage]["median_seconds"]
+            if previous > 0:
+                line += f"  ({(values['median_seconds'] / previous - 1) * 100:+.0f}% vs baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the notdienst pipeline.")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000",
+                        help="Comma separated numbers of feed entries.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage and size.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="The stored baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="The allowed slowdown against the baseline, 0.2 = 20%%.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as the new baseline.")
+    args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    for size in args.sizes.split(","):
+        # The feed is built here, so its construction does not count for the peak RSS
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            feed_file = os.path.join(tmp_dir, "feed.xml")
+            with open(feed_file, "wb") as f:
+                f.write(build_feed(int(size)))
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", feed_file, str(args.repeat)],
+                check=True, capture_output=True, text=True).stdout
+        results[size] = json.loads(output.strip().splitlines()[-1])
+        print_result(size, results[size], baseline and baseline.get("sizes", {}).get(size))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "repeat": args.repeat, "sizes": results}, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("No baseline yet, store one with --save-baseline.")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regression beyond {args.threshold * 100:.0f}% against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        print(json.dumps(run_size(sys.argv[2], int(sys.argv[3]))))
+    else:
+        sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Measures the cold start of one notdienst.py run, as started by the respawn loop
+of startNotdienst.sh, and summarizes its -X importtime output.
+
+Usage:
+python bench/coldstart.py [--runs 10] [--top 15] [--target-ms 200] [--feed test/xmltestdata.xml]
+
+Every run is a fresh interpreter in TEST_MODE on a temporary directory, so the
+fetch is a file read and the numbers show the start-up overhead. The first run
+renders the page; the later runs find the feed unchanged, like most cycles.
+The exit code is 1 if the median of the later runs misses the target.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def parse_importtime(stderr):
+    """
+    Parses the -X importtime output.
+
+    Returns:
+        tuple: The total import time in microseconds and the (cumulative microseconds,
+            module) of the modules imported directly by notdienst.py.
+    """
+    total = 0
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        total += self_us
+        # One space for the top level, two more per nesting level
+        if len(name) - len(name.lstrip()) == 1:
+            top_level.append((cumulative_us, name.strip()))
+    return total, sorted(top_level, reverse=True)
+
+
+def bare_interpreter(runs=5):
+    """
+    Returns the median seconds of starting the bare interpreter.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run_once(env, cwd, importtime=False):
+    """
+    Runs notdienst.py once.
+
+    Returns:
+        tuple: The wall clock seconds and the stderr of the run.
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + \
+        [os.path.join(REPO_DIR, "notdienst.py")]
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, cwd=cwd, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of notdienst.py.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs after the first one.")
+    parser.add_argument("--top", type=int, default=15, help="Modules shown in the import summary.")
+    parser.add_argument("--target-ms", type=float, default=200, help="Target for the median run.")
+    parser.add_argument("--feed", default=os.path.join(REPO_DIR, "test", "xmltestdata.xml"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, TEST_MODE="True", TEST_XML_FILE=args.feed,
+                   DAEMON_MODE="False", SERVER_MODE="False", SITES_FILE="", ROSTER_DB="", QR_DIR="",
+                   XML_FILE=os.path.join(tmp_dir, "data.xml"),
+                   HTML_PAGE=os.path.join(tmp_dir, "index.html"),
+                   HTML_TEMPLATE=os.path.join(REPO_DIR, "templates", "template.html"))
+
+        interpreter = bare_interpreter()
+        first, _ = run_once(env, tmp_dir)
+        runs = [run_once(env, tmp_dir)[0] for _ in range(args.runs)]
+        _, stderr = run_once(env, tmp_dir, importtime=True)
+
+    total_us, top_level = parse_importtime(stderr)
+    median = statistics.median(runs)
+    print(f"Bare interpreter:       {interpreter * 1000:7.1f} ms")
+    print(f"First run (renders):    {first * 1000:7.1f} ms")
+    print(f"Unchanged feed, median: {median * 1000:7.1f} ms over {args.runs} runs "
+          f"(min {min(runs) * 1000:.1f} ms, max {max(runs) * 1000:.1f} ms)")
+    print(f"Imports:                {total_us / 1000:7.1f} ms in total")
+    for cumulative_us, name in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if median * 1000 > args.target_ms:
+        print(f"MISSED the target of {args.target_ms:.0f} ms")
+        return 1
+    print(f"Within the target of {args.target_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
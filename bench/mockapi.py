@@ -0,0 +1,294 @@
+"""
+A local stand-in for the upstream API, serving a feed in the container/entries/entry
+schema with configurable faults.
+
+Usage:
+python bench/mockapi.py [--port 8765] [--entries 1000 | --feed test/xmltestdata.xml]
+                        [--latency 0.2] [--jitter 0.1] [--bandwidth 100000]
+                        [--rate-limit 5] [--no-conditional] [--gzip]
+                        [--truncate-rate 0.1] [--malformed-rate 0.1]
+                        [--error-every 10 --error-burst 3 --error-status 503]
+
+Point API_URL at http://127.0.0.1:8765/ to run notdienst against it.
+"""
+
+import sys
+import gzip
+import time
+import random
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthfeed import build_feed
+
+
+class MockApi:
+    """
+    A class used to serve a feed like the upstream API, with injected latency,
+    throttling, conditional requests, truncated bodies and 5xx bursts.
+    """
+
+    def __init__(self, xml_data, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 bandwidth=None, rate_limit=None, conditional=True, use_gzip=False,
+                 truncate_rate=0.0, malformed_rate=0.0, error_every=0, error_burst=0,
+                 error_status=503, seed=None):
+        """
+        Initializes the MockApi object.
+
+        Args:
+            xml_data (bytes): The feed served on every path.
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for a free one.
+            latency (float): The seconds before the response headers are sent.
+            jitter (float): Up to this many seconds are added to the latency at random.
+            bandwidth (int, optional): The bytes per second the body is sent with.
+            rate_limit (float, optional): The requests per second answered before
+                further requests get a 429 with Retry-After.
+            conditional (bool): Whether ETag/Last-Modified are sent and 304 answered.
+            use_gzip (bool): Whether the body is gzipped for clients accepting it.
+            truncate_rate (float): The share of responses whose connection is dropped
+                halfway through the body.
+            malformed_rate (float): The share of responses with a cut off, but
+                complete (matching Content-Length), XML body.
+            error_every (int): The length of the request cycle the error bursts repeat in.
+            error_burst (int): The number of requests at the start of every cycle
+                answered with error_status.
+            error_status (int): The status code of the error bursts.
+            seed (int, optional): The seed of the random faults, for reproducible runs.
+        """
+        self.xml_data = xml_data
+        self.gzip_data = gzip.compress(xml_data, mtime=0)
+        self.etag = f'"{hashlib.sha256(xml_data).hexdigest()[:16]}"'
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.rate_limit = rate_limit
+        self.conditional = conditional
+        self.use_gzip = use_gzip
+        self.truncate_rate = truncate_rate
+        self.malformed_rate = malformed_rate
+        self.error_every = error_every
+        self.error_burst = error_burst
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.status_counts = {}
+        self._window = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Returns the URL of the feed.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _handler_class(self):
+        """
+        Returns the request handler class bound to this server.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                mock.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _count(self, status):
+        """
+        Counts a response by its status.
+        """
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def _throttled(self):
+        """
+        Returns True if the request exceeds the rate limit of the last second.
+        """
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                return True
+            self._window.append(now)
+        return False
+
+    def handle(self, handler):
+        """
+        Answers one request.
+        """
+        with self._lock:
+            index = self.requests
+            self.requests += 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if self.error_every and index % self.error_every < self.error_burst:
+            self._send_empty(handler, self.error_status)
+            return
+        if self._throttled():
+            self._send_empty(handler, 429, {"Retry-After": "1"})
+            return
+
+        validators = {}
+        if self.conditional:
+            validators = {"ETag": self.etag, "Last-Modified": self.last_modified}
+            if handler.headers.get("If-None-Match") == self.etag \
+                    or handler.headers.get("If-Modified-Since") == self.last_modified:
+                self._send_empty(handler, 304, validators)
+                return
+
+        body = self.xml_data
+        headers = {"Content-Type": "application/xml; charset=utf-8", **validators}
+        if self.use_gzip and "gzip" in handler.headers.get("Accept-Encoding", ""):
+            body = self.gzip_data
+            headers["Content-Encoding"] = "gzip"
+
+        if self.malformed_rate and self.random.random() < self.malformed_rate:
+            # A complete response with a cut off document
+            body = self.xml_data[:len(self.xml_data) // 2]
+            headers.pop("Content-Encoding", None)
+            headers.pop("ETag", None)
+            headers.pop("Last-Modified", None)
+            malformed = True
+        else:
+            malformed = False
+        truncate = self.truncate_rate and self.random.random() < self.truncate_rate
+
+        handler.send_response(200)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        if truncate:
+            handler.send_header("Connection", "close")
+        handler.end_headers()
+        self._count("truncated" if truncate else "malformed" if malformed else 200)
+
+        if truncate:
+            # Announce the whole body, but drop the connection halfway through
+            self._write(handler, body[:len(body) // 2])
+            handler.close_connection = True
+            return
+        self._write(handler, body)
+
+    def _write(self, handler, body):
+        """
+        Writes the body, limited to the bandwidth if one is set.
+        """
+        try:
+            if not self.bandwidth:
+                handler.wfile.write(body)
+                return
+            chunk_size = max(1, self.bandwidth // 20)
+            for start in range(0, len(body), chunk_size):
+                handler.wfile.write(body[start:start + chunk_size])
+                time.sleep(chunk_size / self.bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_empty(self, handler, status, headers=None):
+        """
+        Sends a response without body.
+        """
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+        self._count(status)
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mockapi", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def add_arguments(parser):
+    """
+    Adds the fault options of the mock API to an argument parser.
+    """
+    parser.add_argument("--entries", type=int, default=1000, help="Entries of the synthetic feed.")
+    parser.add_argument("--feed", help="Serve this XML file instead of a synthetic feed.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency in seconds.")
+    parser.add_argument("--bandwidth", type=int, help="Bytes per second of the body.")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before a 429.")
+    parser.add_argument("--no-conditional", action="store_true", help="No ETag/Last-Modified and 304.")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the body if the client accepts it.")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of dropped bodies.")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of cut off XML bodies.")
+    parser.add_argument("--error-every", type=int, default=0, help="Length of the error burst cycle.")
+    parser.add_argument("--error-burst", type=int, default=0, help="Failing requests per cycle.")
+    parser.add_argument("--error-status", type=int, default=503, help="Status code of the bursts.")
+    parser.add_argument("--seed", type=int, help="Seed of the random faults.")
+
+
+def from_arguments(args, host="127.0.0.1", port=0):
+    """
+    Creates a MockApi from the parsed fault options.
+    """
+    if args.feed:
+        with open(args.feed, "rb") as f:
+            xml_data = f.read()
+    else:
+        xml_data = build_feed(args.entries)
+    return MockApi(xml_data, host=host, port=port, latency=args.latency, jitter=args.jitter,
+                   bandwidth=args.bandwidth, rate_limit=args.rate_limit,
+                   conditional=not args.no_conditional, use_gzip=args.gzip,
+                   truncate_rate=args.truncate_rate, malformed_rate=args.malformed_rate,
+                   error_every=args.error_every, error_burst=args.error_burst,
+                   error_status=args.error_status, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a feed like the upstream API, with faults.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock = from_arguments(args, args.host, args.port).start()
+    print(f"Serving {len(mock.xml_data)} bytes on {mock.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+        print(f"{mock.requests} requests: {mock.status_counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+import copy
+from lxml import etree
+
+SAMPLE_XML_FILE = os.path.join(os.path.dirname(__file__), "..", "test", "xmltestdata.xml")
+
+
+def build_feed(entry_count, sample_xml_file=SAMPLE_XML_FILE):
+    """
+    Builds a synthetic feed in the container/entries/entry schema.
+
+    The entries of the sample feed are repeated until entry_count is reached, each
+    copy getting a unique id and slightly shifted coordinates.
+
+    Args:
+        entry_count (int): The number of entries of the synthetic feed.
+        sample_xml_file (str): The feed whose entries are used as templates.
+
+    Returns:
+        bytes: The XML data of the synthetic feed.
+    """
+    root = etree.parse(sample_xml_file).getroot()
+    entries = root.find("entries")
+    samples = list(entries)
+    for entry in samples:
+        entries.remove(entry)
+
+    for index in range(entry_count):
+        entry = copy.deepcopy(samples[index % len(samples)])
+        entry.find("id").text = f"{index:032x}"
+        entry.find("name").text = f"{entry.find('name').text} {index}"
+        entry.find("lat").text = str(49.0 + (index % 1000) / 1000)
+        entry.find("lon").text = str(9.0 + (index // 1000 % 1000) / 1000)
+        entries.append(entry)
+
+    return etree.tostring(root, encoding="utf-8", xml_declaration=True)
@@ -0,0 +1,104 @@
+import logging
+import json
+import hashlib
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeDetector:
+    """
+    A class used to detect whether data has changed since the last refresh.
+
+    The digests are persisted in a small JSON state file, so the detection also
+    works across restarts. A detected change is only remembered once commit() is
+    called, after the new data has been handled (e.g. rendered), so a failure in
+    between is detected as a change again by the next check. The HTTP validators
+    of the last handled response are kept in the same file, so conditional
+    requests also work across restarts.
+    """
+
+    def __init__(self, state_file):
+        """
+        Initializes the ChangeDetector object and loads the persisted digests.
+
+        Args:
+            state_file (str): The path to the JSON state file.
+        """
+        self.state_file = state_file
+        self.digests = {}
+        self.pending = {}
+        self.validators = {}
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                self.digests = json.load(f)
+            self.validators = self.digests.pop("validators", None) or {}
+        except (IOError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def digest(data):
+        """
+        Returns the SHA-256 hex digest of the given bytes.
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def changed(self, key, data):
+        """
+        Checks whether the data stored under key differs from the last committed
+        data. The new digest is kept pending until commit().
+
+        Args:
+            key (str): The name of the data, e.g. "body" or "entries".
+            data (bytes): The current data.
+
+        Returns:
+            bool: True if the data is new or differs from the last known data.
+        """
+        digest = self.digest(data)
+        if self.digests.get(key) == digest:
+            metrics.cache(key, hit=True)
+            self.pending.pop(key, None)
+            return False
+        metrics.cache(key, hit=False)
+        self.pending[key] = digest
+        return True
+
+    def commit(self):
+        """
+        Remembers the digests of the changes detected since the last commit.
+        """
+        self.digests.update(self.pending)
+        self.pending.clear()
+
+    def forget(self, key):
+        """
+        Drops the digest stored under key, so the next check reports a change.
+        """
+        self.digests.pop(key, None)
+        self.pending.pop(key, None)
+
+    def save(self):
+        """
+        Persists the digests to the state file.
+        """
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump({**self.digests, "validators": self.validators}, f, indent=2)
+        except IOError as e:
+            logger.error("An error occurred while saving the change state to %s: %s", self.state_file, e)
+
+
+def normalize_entries(pharmacy_list):
+    """
+    Serializes the pharmacy entries independent of their order in the feed.
+
+    Args:
+        pharmacy_list (list): The Pharmacy records as returned by ImportApiData.
+
+    Returns:
+        bytes: The canonical JSON representation of the entries.
+    """
+    entries = sorted((pharmacy.as_dict() for pharmacy in pharmacy_list), key=lambda entry: entry["id"])
+    return json.dumps(entries, sort_keys=True, separators=(",", ":")).encode()
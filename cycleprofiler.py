@@ -0,0 +1,188 @@
+import os
+import io
+import sys
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# The modules whose functions are listed separately in the summary
+FOCUS_MODULES = r"importapidata\.py|htmlcreator\.py"
+
+# From Python 3.12 on cProfile uses sys.monitoring: one profile sees all threads,
+# and a second one cannot be enabled while it is active
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class CycleProfiler:
+    """
+    A class used to profile the next refresh cycles of the running process on demand.
+
+    Once requested, e.g. by a signal or the /profile endpoint, the next cycles run
+    under cProfile and tracemalloc. After each of them a pstats file and a text
+    summary are written to the output directory: the slowest functions, those of
+    ImportApiData and HtmlCreator in particular, and the allocation sites that grew
+    the most since the previous snapshot. Outside of a request nothing is traced.
+    """
+
+    def __init__(self, output_dir, cycles=3, top=25, frames=10):
+        """
+        Initializes the CycleProfiler object.
+
+        Args:
+            output_dir (str): The directory the results are written to.
+            cycles (int): The number of cycles profiled per request.
+            top (int): The number of functions and allocation sites in the summary.
+            frames (int): The traceback frames stored per allocation by tracemalloc.
+        """
+        self.output_dir = output_dir
+        self.cycles = cycles
+        self.top = top
+        self.frames = frames
+        self.remaining = 0
+        self._signalled = False
+        self._lock = threading.Lock()
+        self._profiles = None
+        self._snapshot = None
+        self._started_tracing = False
+
+    def request(self, cycles=None):
+        """
+        Requests the profiling of the next cycles, e.g. from the thread of the
+        /profile endpoint. A running request is extended, not restarted.
+
+        Args:
+            cycles (int, optional): The number of cycles, defaults to the configured one.
+
+        Returns:
+            str: A confirmation, e.g. as the body of the endpoint.
+        """
+        with self._lock:
+            self.remaining = max(self.remaining, cycles or self.cycles)
+            remaining = self.remaining
+        logger.info("Profiling the next %d refresh cycles into %s", remaining, self.output_dir)
+        return f"Profiling the next {remaining} refresh cycles into {self.output_dir}\n"
+
+    def handle_signal(self, signum=None, frame=None):
+        """
+        Requests the profiling of the next cycles. Can be used directly as a signal handler.
+
+        The handler runs on the main thread, possibly while cycle() holds the lock,
+        so it only sets a flag that the next cycle picks up.
+        """
+        self._signalled = True
+
+    def wrap(self, function):
+        """
+        Returns the function profiled in the thread it is called in, if the current
+        cycle is profiled, for work submitted to the fetch and render pools.
+
+        Before Python 3.12 cProfile only sees the thread it is enabled in, so every
+        call gets its own profile, which is merged into the one of the cycle. Later
+        versions profile the pool threads with the profile of the cycle already.
+        """
+        profiles = self._profiles
+        if profiles is None or PROFILES_ALL_THREADS:
+            return function
+
+        def profiled(*args, **kwargs):
+            import cProfile
+
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                profiles.append(profile)
+
+        return profiled
+
+    @contextmanager
+    def cycle(self):
+        """
+        Profiles the enclosed refresh cycle if profiling was requested.
+        """
+        if self._signalled:
+            self._signalled = False
+            self.request()
+        with self._lock:
+            profiled = self.remaining > 0
+        if not profiled:
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        if self._snapshot is None:
+            self._snapshot = tracemalloc.take_snapshot()
+
+        started_at = datetime.now()
+        profile = cProfile.Profile()
+        self._profiles = [profile]
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profiles, self._profiles = self._profiles, None
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            try:
+                self._write(started_at, profiles, snapshot, current, peak)
+            except Exception as e:
+                # The profiling must never break the refresh cycle
+                logger.error("Could not write the profile: %s", e)
+
+            with self._lock:
+                self.remaining -= 1
+                done = self.remaining <= 0
+            if done:
+                self._snapshot = None
+                if self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            else:
+                self._snapshot = snapshot
+
+    def _write(self, started_at, profiles, snapshot, current, peak):
+        """
+        Writes the merged profile and the summary of one cycle.
+        """
+        import pstats
+        import tracemalloc
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{started_at.strftime('%Y%m%d-%H%M%S-%f')}")
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=summary)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(f"{base}.prof")
+
+        summary.write(f"Refresh cycle started at {started_at.isoformat(timespec='seconds')}\n")
+        summary.write(f"Traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+        summary.write("Slowest functions of ImportApiData and HtmlCreator (cumulative):\n")
+        stats.sort_stats("cumulative").print_stats(FOCUS_MODULES, self.top)
+        summary.write("Slowest functions overall (own time):\n")
+        stats.sort_stats("tottime").print_stats(self.top)
+
+        # The allocations of tracemalloc itself and of the import machinery are noise
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+        differences = snapshot.filter_traces(ignored).compare_to(
+            self._snapshot.filter_traces(ignored), "lineno")
+        summary.write("Top allocation sites by growth since the previous snapshot:\n")
+        for difference in differences[:self.top]:
+            summary.write(f"  {difference}\n")
+
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        growth = sum(difference.size_diff for difference in differences)
+        logger.info("Profile written to %s.txt (memory %+.1f KiB since the previous snapshot)",
+                    base, growth / 1024)
@@ -0,0 +1,322 @@
+import os
+import logging
+import gzip
+import asyncio
+import hashlib
+import mimetypes
+import threading
+from datetime import datetime, timezone
+from email.utils import formatdate
+
+from assetpipeline import HASHED_NAME
+
+logger = logging.getLogger(__name__)
+
+# Only these file types are served, never the feed dumps, snapshots or databases
+STATIC_TYPES = {".html", ".css", ".js", ".json", ".csv", ".ics", ".png", ".jpg", ".jpeg", ".gif",
+                ".svg", ".webp", ".ico"}
+# The change detection state next to the XML dump is private as well
+PRIVATE_SUFFIXES = (".state.json",)
+
+# Requests with more header lines are refused
+MAX_HEADERS = 100
+
+REASONS = {200: "OK", 302: "Found", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed"}
+
+
+class CachedResponse:
+    """
+    An immutable, ready-to-send response body with its validators.
+    """
+
+    __slots__ = ("body", "gzip_body", "etag", "content_type", "mtime")
+
+    def __init__(self, body, content_type, mtime=None):
+        """
+        Initializes the CachedResponse object and precomputes the gzip body and ETag.
+
+        Args:
+            body (bytes): The response body.
+            content_type (str): The Content-Type of the body.
+            mtime (float, optional): The mtime of the file the body was read from.
+        """
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.content_type = content_type
+        self.mtime = mtime
+
+
+class DisplayServer:
+    """
+    A small asyncio HTTP server that serves the rendered display pages from memory.
+
+    The pages are replaced atomically by update() after each refresh. Requests for
+    other paths (logos, styles) are served from the static directories below the
+    document root and kept in memory until the file changes; content-hashed assets
+    are cached for a year. Paths registered in handlers are answered by
+    calling the handler, which returns the content type and the body as str.
+    Paths registered in redirects are redirected to their URL path, e.g. "/" to
+    the start page, so the relative URLs of the page resolve.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8080, document_root=".", static_dirs=(), expires_at=None,
+                 default_max_age=60, keep_alive_timeout=75):
+        """
+        Initializes the DisplayServer object.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            document_root (str): The directory the URL paths are relative to, or None
+                to serve no static files.
+            static_dirs (iterable): The directories below the document root whose
+                files are served (not their subdirectories). Dotfiles and files that
+                are not web content (e.g. .env, the XML dump, the snapshots and the
+                roster store) are never served.
+            expires_at (callable, optional): Returns the datetime of the next refresh,
+                used for the max-age of the pages.
+            default_max_age (int): The max-age in seconds if the next refresh is unknown.
+            keep_alive_timeout (int): Seconds an idle keep-alive connection stays open.
+        """
+        self.host = host
+        self.port = port
+        self.document_root = os.path.realpath(document_root) if document_root else None
+        self.static_dirs = {os.path.realpath(directory) for directory in static_dirs}
+        self.expires_at = expires_at
+        self.default_max_age = default_max_age
+        self.keep_alive_timeout = keep_alive_timeout
+        self.pages = {}
+        self.handlers = {}
+        self.redirects = {}
+        self.static_files = {}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._error = None
+
+    def url_path(self, file_path):
+        """
+        Returns the URL path under which a file of the document root is served.
+        """
+        relative_path = os.path.relpath(os.path.realpath(file_path), self.document_root)
+        return "/" + relative_path.replace(os.sep, "/")
+
+    def update(self, path, content, content_type="text/html; charset=utf-8"):
+        """
+        Replaces the in-memory content served under a URL path.
+
+        Args:
+            path (str): The URL path, e.g. "/data/index.html".
+            content (str or bytes): The new content.
+            content_type (str): The Content-Type of the content.
+        """
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        # A single assignment, so requests see either the old or the new page
+        self.pages[path] = CachedResponse(content, content_type)
+
+    def _max_age(self):
+        """
+        Returns the seconds until the next refresh, used as max-age for the pages.
+        """
+        expires = self.expires_at() if self.expires_at else None
+        if expires is None:
+            return self.default_max_age
+        return max(0, int((expires - datetime.now(timezone.utc)).total_seconds()))
+
+    def _static_file(self, path):
+        """
+        Returns the cached response for a file of the document root, or None.
+        """
+        if self.document_root is None:
+            return None
+        file_path = os.path.realpath(os.path.join(self.document_root, path.lstrip("/")))
+        if os.path.commonpath([file_path, self.document_root]) != self.document_root:
+            return None
+        name = os.path.basename(file_path)
+        if os.path.dirname(file_path) not in self.static_dirs or name.startswith(".") \
+                or os.path.splitext(name)[1].lower() not in STATIC_TYPES or name.endswith(PRIVATE_SUFFIXES):
+            return None
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            return None
+        cached = self.static_files.get(file_path)
+        if cached is None or cached.mtime != mtime:
+            if not os.path.isfile(file_path):
+                return None
+            with open(file_path, "rb") as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            cached = CachedResponse(body, content_type, mtime)
+            self.static_files[file_path] = cached
+        return cached
+
+    def respond(self, method, target, headers):
+        """
+        Builds the response for a request.
+
+        Args:
+            method (str): The request method.
+            target (str): The request target (path and query).
+            headers (dict): The request headers with lower-case names.
+
+        Returns:
+            tuple: The status code, the response headers and the body.
+        """
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b""
+
+        path = target.split("?", 1)[0]
+        location = self.redirects.get(path)
+        if location is not None:
+            return 302, {"Location": location, "Cache-Control": "no-store"}, b""
+        handler = self.handlers.get(path)
+        if handler is not None:
+            # Dynamic content, e.g. the metrics, is built per request and never cached
+            content_type, body = handler()
+            return 200, {"Content-Type": content_type, "Cache-Control": "no-store"}, body.encode("utf-8")
+
+        cached = self.pages.get(path)
+        if cached is not None:
+            cache_control = f"public, max-age={self._max_age()}"
+        else:
+            cached = self._static_file(path)
+            if HASHED_NAME.search(path):
+                # A content-hashed asset gets a new name when it changes
+                cache_control = "public, max-age=31536000, immutable"
+            else:
+                cache_control = f"public, max-age={self.default_max_age}"
+        if cached is None:
+            return 404, {"Content-Type": "text/plain"}, b"Not Found"
+
+        response_headers = {
+            "Content-Type": cached.content_type,
+            "ETag": cached.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        body = cached.body
+        if "gzip" in headers.get("accept-encoding", ""):
+            # The encoded variant needs its own validator
+            response_headers["ETag"] = cached.etag[:-1] + '-gzip"'
+            response_headers["Content-Encoding"] = "gzip"
+            body = cached.gzip_body
+
+        if_none_match = headers.get("if-none-match", "")
+        if if_none_match and (cached.etag in if_none_match or cached.etag[:-1] + '-gzip"' in if_none_match):
+            response_headers.pop("Content-Encoding", None)
+            return 304, response_headers, b""
+        return 200, response_headers, body
+
+    @staticmethod
+    async def _read_headers(reader):
+        """
+        Reads the header lines of a request.
+
+        Returns:
+            dict: The headers with lower-case names.
+
+        Raises:
+            ValueError: If a line is too long or there are more than MAX_HEADERS lines.
+        """
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError("Too many header lines")
+
+    async def _handle(self, reader, writer):
+        """
+        Serves the requests of one (keep-alive) connection.
+        """
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+                    if not request_line:
+                        break
+                    method, target, version = request_line.decode("latin-1").split()
+                    # A client sending its headers slowly must not hold the connection either
+                    headers = await asyncio.wait_for(self._read_headers(reader), self.keep_alive_timeout)
+                except (ValueError, asyncio.LimitOverrunError):
+                    # A malformed request line, too long lines or too many headers
+                    status, response_headers, body, method, version = 400, {}, b"", "GET", "HTTP/1.0"
+                    headers = {}
+                else:
+                    status, response_headers, body = self.respond(method, target, headers)
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = status != 400 and (connection == "keep-alive" if version == "HTTP/1.0"
+                                                else connection != "close")
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Date"] = formatdate(usegmt=True)
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+                head = f"HTTP/1.1 {status} {REASONS[status]}\r\n" + "".join(
+                    f"{name}: {value}\r\n" for name, value in response_headers.items()) + "\r\n"
+                writer.write(head.encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self, started):
+        """
+        Runs the server until stop() is called.
+        """
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        except Exception as e:
+            # Raised again by start(), e.g. if the port is in use
+            self._error = e
+            started.set()
+            return
+        logger.info("Serving on http://%s:%d/", self.host, self.port)
+        started.set()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def start(self, timeout=5):
+        """
+        Starts the server in a background thread.
+
+        Args:
+            timeout (float): Seconds to wait for the server to listen.
+
+        Raises:
+            OSError: If the server cannot listen, e.g. because the port is in use.
+            TimeoutError: If the server does not listen within the timeout.
+        """
+        started = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(started),),
+                                        name="display-server", daemon=True)
+        self._thread.start()
+        if not started.wait(timeout):
+            raise TimeoutError(f"The server on {self.host}:{self.port} did not start within {timeout} s")
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        """
+        Stops the server and waits for its thread to finish.
+        """
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(5)
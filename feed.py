@@ -0,0 +1,122 @@
+import logging
+import pickle
+
+from publisher import publish
+
+logger = logging.getLogger(__name__)
+
+
+class FeedError(Exception):
+    """
+    Raised when a feed brings no usable data: the fetch failed or the data does not parse.
+    """
+
+
+class Feed:
+    """
+    A class used to bundle one upstream feed with its change detection, its last
+    good parsed snapshot and its running background fetch.
+    """
+
+    def __init__(self, importer, change_detector, snapshot_file):
+        """
+        Initializes the Feed object.
+
+        Args:
+            importer (ImportApiData): The importer for the API data.
+            change_detector (ChangeDetector): The detector holding the digests of the last cycle.
+            snapshot_file (str): The path to the pickled snapshot of the last good roster.
+        """
+        self.importer = importer
+        self.change_detector = change_detector
+        self.snapshot_file = snapshot_file
+        self.pending = None
+
+    def start_fetch(self, executor, wrap=None):
+        """
+        Starts loading the feed in the background, unless a fetch is still pending.
+
+        A fetch that outlived the deadline of an earlier cycle is kept, so its result
+        is used by the next cycle instead of being thrown away.
+
+        Args:
+            executor (Executor): The pool the fetch runs in.
+            wrap (callable, optional): Wraps the load function, e.g. to profile it.
+
+        Returns:
+            Future: The pending fetch, resolving to the result of ImportApiData.load().
+        """
+        if self.pending is None:
+            # Only the validators of a handled response are sent, so a response that
+            # failed to parse or render is fetched again in full
+            self.importer.etag = self.change_detector.validators.get("etag")
+            self.importer.last_modified = self.change_detector.validators.get("last_modified")
+            load = self.importer.load if wrap is None else wrap(self.importer.load)
+            self.pending = executor.submit(load)
+        return self.pending
+
+    def take_fetch(self, timeout):
+        """
+        Waits for the pending fetch and hands over its result.
+
+        Args:
+            timeout (float): The seconds to wait at most.
+
+        Returns:
+            bytes: The result of ImportApiData.load().
+
+        Raises:
+            concurrent.futures.TimeoutError: If the fetch is still running; it stays
+                pending for the next cycle.
+            Exception: The error of a failed fetch; the next cycle starts a new one.
+        """
+        try:
+            return self.pending.result(timeout=timeout)
+        finally:
+            # A finished fetch is handed over even if it failed, so the next cycle
+            # starts a new one instead of raising the same error again
+            if self.pending.done():
+                self.pending = None
+
+    def commit(self):
+        """
+        Remembers the last fetched data and its validators once it has been handled.
+        """
+        self.change_detector.validators = {"etag": self.importer.etag,
+                                           "last_modified": self.importer.last_modified}
+        self.change_detector.commit()
+        self.change_detector.save()
+
+    def forget(self):
+        """
+        Forgets the last fetched data, so the next cycle fetches and parses it in full.
+        """
+        self.change_detector.forget("body")
+        self.change_detector.forget("entries")
+        self.change_detector.validators = {}
+        self.change_detector.save()
+
+    def load_snapshot(self):
+        """
+        Loads the snapshot of the last good roster.
+
+        Returns:
+            list: The Pharmacy records, or None if there is no readable snapshot.
+        """
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning("No usable snapshot in %s: %s", self.snapshot_file, e)
+            return None
+
+    def save_snapshot(self, pharmacy_list):
+        """
+        Saves the roster as snapshot, atomically and only if it changed.
+
+        Args:
+            pharmacy_list (list): The Pharmacy records.
+        """
+        publish(self.snapshot_file, (pickle.dumps(pharmacy_list, pickle.HIGHEST_PROTOCOL),))
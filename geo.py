@@ -0,0 +1,79 @@
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Calculate the distances from one point to many points with the Haversine formula.
+
+    Parameters:
+    lat (float): Latitude of the origin in degrees.
+    lon (float): Longitude of the origin in degrees.
+    lats (array_like): Latitudes of the destinations in degrees.
+    lons (array_like): Longitudes of the destinations in degrees.
+
+    Returns:
+    numpy.ndarray: The distances in kilometers.
+    """
+    import numpy as np
+
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def select_nearest(distances, max_rows=None):
+    """
+    Select the positions of the smallest distances, nearest first.
+
+    Only the max_rows smallest distances are selected (argpartition) and sorted;
+    equal distances keep their order.
+
+    Parameters:
+    distances (numpy.ndarray): The distances.
+    max_rows (int, optional): The number of positions to return. All if None.
+
+    Returns:
+    numpy.ndarray: The positions of the selected distances, nearest first.
+    """
+    import numpy as np
+
+    if max_rows is not None and max_rows < len(distances):
+        if max_rows <= 0:
+            return np.empty(0, dtype=int)
+        selected = np.argpartition(distances, max_rows - 1)[:max_rows]
+        return selected[np.argsort(distances[selected], kind="stable")]
+    return np.argsort(distances, kind="stable")
+
+
+def nearest_pharmacies(pharmacy_list, lat, lon, max_rows=None):
+    """
+    Select the pharmacies closest to a location, sorted by distance.
+
+    All distances are calculated in one vectorized pass. Only the max_rows closest
+    records are selected and sorted (select_nearest). The returned records are copies
+    carrying the distance, so one roster can be shared by sites at different places.
+
+    Parameters:
+    pharmacy_list (list): The Pharmacy records.
+    lat (float): Latitude of the location in degrees.
+    lon (float): Longitude of the location in degrees.
+    max_rows (int, optional): The number of pharmacies to return. All if None.
+
+    Returns:
+    list: The closest Pharmacy records, nearest first.
+    """
+    if not pharmacy_list:
+        return []
+    # NumPy is only loaded by sites that sort by distance
+    import numpy as np
+
+    lats = np.fromiter((pharmacy.lat for pharmacy in pharmacy_list), dtype=float, count=len(pharmacy_list))
+    lons = np.fromiter((pharmacy.lon for pharmacy in pharmacy_list), dtype=float, count=len(pharmacy_list))
+    distances = haversine_many(lat, lon, lats, lons)
+
+    return [pharmacy_list[index].with_distance(float(distances[index]))
+            for index in select_nearest(distances, max_rows)]
@@ -1,13 +1,23 @@
 import os
+import json
+import logging
+import hashlib
 import html
-from datetime import datetime
-from jinja2 import Template
+from datetime import datetime, timezone
+
+from publisher import publish
+from assetpipeline import AssetPipeline
+from metrics import metrics
+from logsetup import dump_payload, payload_enabled
+
+logger = logging.getLogger(__name__)
 
 class HtmlCreator:
     """A class used to create an HTML page with a logo image in the top left corner.
     """
 
-    def __init__(self, html_page, html_title, html_logo_left, html_logo_right, html_template):
+    def __init__(self, html_page, html_title, html_logo_left, html_logo_right, html_template,
+                 template_cache_dir=None, precompress=(), qr_codes=None, asset_dir=None):
         """
         Initializes the HtmlCreator object with the necessary parameters.
 
@@ -15,55 +25,210 @@ class HtmlCreator:
             html_page (str): The path to the HTML page.
             html_title (str): The title of the HTML page.
             html_logo (str): The path to the logo image.
+            html_template (str): The path to the Jinja2 template.
+            template_cache_dir (str, optional): The directory for the compiled template
+                bytecode. Defaults to a .jinja_cache directory next to the template.
+            precompress (iterable, optional): Encodings ("gz", "br") of precompressed
+                copies written next to the HTML page for the web server.
+            qr_codes (QrCodeCache, optional): The cache providing a maps QR code per pharmacy.
+            asset_dir (str, optional): The directory for the content-hashed styles,
+                scripts and logos. Defaults to an assets directory next to the HTML page.
         """
         self.html_page = html_page
         self.html_title = html_title
         self.html_logo_left = html_logo_left
         self.html_logo_right = html_logo_right
         self.html_template = html_template
+        self.precompress = tuple(precompress)
+        self.qr_codes = qr_codes
+        # The table rows polled by the page, next to it, e.g. index.json for index.html
+        self.data_file = os.path.splitext(html_page)[0] + ".json"
+        self.table_data = None
+        if qr_codes is not None:
+            # The images are referenced relative to the page
+            qr_dir = os.path.relpath(qr_codes.cache_dir, os.path.dirname(os.path.abspath(html_page)))
+            self.qr_prefix = qr_dir.replace(os.sep, "/")
+        # A page published by an earlier run counts as rendered at its mtime
+        try:
+            self.rendered_at = datetime.fromtimestamp(os.path.getmtime(html_page), timezone.utc)
+        except OSError:
+            self.rendered_at = None
 
+        self.template_dir, self.template_name = os.path.split(os.path.abspath(html_template))
+        page_dir = os.path.dirname(os.path.abspath(html_page))
+        if asset_dir is None:
+            asset_dir = os.path.join(page_dir, "assets")
+        self.assets = AssetPipeline(asset_dir, page_dir, self.precompress)
+        if template_cache_dir is None:
+            template_cache_dir = os.path.join(self.template_dir, ".jinja_cache")
+        self.template_cache_dir = template_cache_dir
+        self._environment = None
 
-    def create_html(self, local_pharmacy_list):
+    @property
+    def environment(self):
         """
-        Creates an HTML page from a template and a list of local pharmacies.
+        The Jinja2 environment, created with the first render, so Jinja2 is not even
+        imported by cycles that find the data unchanged.
+        """
+        if self._environment is None:
+            from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 
-        Parameters:
-            local_pharmacy_list (list): A list of dictionaries containing pharmacy information.
-                Each dictionary should have the following keys:
-                    - name: The name of the pharmacy.
-                    - address: The address of the pharmacy.
-                    - phone: The phone number of the pharmacy.
-                    - service_time: The service time of the pharmacy.
-                    - distance_text: The distance to the pharmacy.
+            # The environment keeps the compiled template in memory and only reloads it
+            # when the mtime of the template file changes
+            os.makedirs(self.template_cache_dir, exist_ok=True)
+            self._environment = Environment(
+                loader=FileSystemLoader(self.template_dir),
+                bytecode_cache=FileSystemBytecodeCache(self.template_cache_dir),
+                autoescape=select_autoescape(),
+                auto_reload=True,
+            )
+        return self._environment
 
-        Returns:
-            str: The rendered HTML page as a string.
+    def _qr_code_src(self, pharmacy):
+        """
+        Returns the image source of the QR code of a pharmacy, or None while it is generated.
+        """
+        filename = self.qr_codes.get(pharmacy)
+        return f"{self.qr_prefix}/{filename}" if filename else None
+
+    def _asset_url(self, path):
+        """
+        Returns the URL of the content-hashed copy of an asset. Relative paths are
+        looked up next to the template first, e.g. styles.css, then in the working
+        directory, e.g. the logos.
+        """
+        if path and not os.path.isabs(path):
+            template_path = os.path.join(self.template_dir, path)
+            if os.path.isfile(template_path):
+                path = template_path
+        return self.assets.url(path)
+
+    def _table_data(self, local_pharmacy_list, show_distance, generated_at):
         """
-        # Load the Jinja2 template
-        template = Template(open(self.html_template, 'r').read())
-        # Extract the data from the XML
-        data = {
+        Returns the table rows as plain values, with a version that only changes
+        when the rows do.
+        """
+        columns = ["from", "to", "name", "street", "zip_code", "location", "phone"]
+        if show_distance:
+            columns.append("distance")
+        if self.qr_codes is not None:
+            columns.append("qr_code")
+
+        rows = []
+        for pharmacy in local_pharmacy_list:
+            row = [pharmacy.from_text, pharmacy.to_text, pharmacy.name, pharmacy.street,
+                   pharmacy.zip_code, pharmacy.location, pharmacy.phone]
+            if show_distance:
+                row.append(pharmacy.distance_text)
+            if self.qr_codes is not None:
+                row.append(self._qr_code_src(pharmacy))
+            rows.append(row)
+
+        version = hashlib.sha256(json.dumps([columns, rows]).encode("utf-8")).hexdigest()[:16]
+        return {"version": version, "columns": columns, "generated_at": generated_at, "rows": rows}
+
+    def _template_data(self, local_pharmacy_list):
+        """
+        Returns the variables passed to the template.
+        """
+        show_distance = any(pharmacy.distance is not None for pharmacy in local_pharmacy_list)
+        generated_at = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+        self.table_data = self._table_data(local_pharmacy_list, show_distance, generated_at)
+        # The QR code sources of the rows, so the page shows exactly those of the table data
+        qr_code_srcs = [row[-1] for row in self.table_data["rows"]] if self.qr_codes is not None else None
+        return {
             'local_pharmacy_list': local_pharmacy_list,
+            'show_distance': show_distance,
+            'qr_code_srcs': qr_code_srcs,
+            'asset_url': self._asset_url,
             'html_logo_left': self.html_logo_left,
             'html_logo_right': self.html_logo_right,
             'html_title': self.html_title,
-            'generated_at': datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+            'generated_at': generated_at,
+            'data_src': os.path.basename(self.data_file),
+            'data_version': self.table_data["version"],
+            'data_columns': ",".join(self.table_data["columns"]),
         }
-        # Render the template with the data
-        html_page_content = template.render(**data)
-        # Print the rendered HTML
-        print(html_page_content)
-        return html_page_content
+
+    def create_html(self, local_pharmacy_list):
+        """
+        Creates an HTML page from a template and a list of local pharmacies.
+
+        Parameters:
+            local_pharmacy_list (list): A list of Pharmacy records.
+
+        Returns:
+            str: The rendered HTML page as a string.
+        """
+        with metrics.stage("render"):
+            template = self.environment.get_template(self.template_name)
+            html_content = template.render(**self._template_data(local_pharmacy_list))
+        dump_payload(f"HTML page {self.html_page}", html_content)
+        return html_content
+
+    def render_to_file(self, local_pharmacy_list):
+        """
+        Renders the HTML page from a template and a list of local pharmacies and
+        streams it straight into the HTML page file.
+
+        Parameters:
+            local_pharmacy_list (list): A list of Pharmacy records.
+
+        Returns:
+            bool: True if the HTML page was written, False if it was unchanged.
+        """
+        if payload_enabled():
+            # The whole page is needed for the payload log
+            return self.save_html_to_file(self.create_html(local_pharmacy_list))
+
+        # The page is rendered while it is written, so the render time includes the write
+        with metrics.stage("render"):
+            template = self.environment.get_template(self.template_name)
+            return self.save_html_to_file(template.generate(**self._template_data(local_pharmacy_list)))
+
+    def create_data(self):
+        """
+        Creates the JSON data file content of the last rendered page.
+
+        The page polls this file and replaces its table rows when the version
+        differs from the one it shows, instead of reloading itself.
+
+        Returns:
+            str: The version, the columns, the time of generation and the table rows as JSON.
+        """
+        return json.dumps(self.table_data, ensure_ascii=False, separators=(",", ":"))
+
+    def save_data_to_file(self, data_content):
+        """
+        Saves the JSON data to the data file, atomically and only if it changed.
+
+        Args:
+            data_content (str): The JSON data as returned by create_data().
+
+        Returns:
+            bool: True if the data file was written, False if it was unchanged.
+        """
+        return publish(self.data_file, (data_content,), self.precompress)
 
     def save_html_to_file(self, html_content):
-#         """Saves the HTML content to a file.
-
-#         Args:
-#         html_content (str): The HTML content to be saved.
-#         """
-        with open(self.html_page, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-            print(f"HTML page saved to {self.html_page}")
+        """Saves the HTML content to the HTML page file.
+
+        The file is replaced atomically and left untouched if the content is unchanged.
+
+        Args:
+        html_content (str or iterable): The HTML content to be saved, whole or in chunks.
+
+        Returns:
+        bool: True if the HTML page was written, False if it was unchanged.
+        """
+        if isinstance(html_content, str):
+            html_content = (html_content,)
+        written = publish(self.html_page, html_content, self.precompress)
+        if written:
+            logger.info("HTML page saved to %s", self.html_page)
+        else:
+            logger.info("HTML page %s unchanged", self.html_page)
+        return written
 
 
     # def create_table_elements(self, local_pharmacy_list):
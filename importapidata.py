@@ -1,7 +1,13 @@
 import os
-import requests
+import logging
+from io import BytesIO
 # import xml.etree.ElementTree as ET
-from lxml import etree
+
+from pharmacy import Pharmacy
+from metrics import metrics
+from logsetup import dump_payload
+
+logger = logging.getLogger(__name__)
 
 
 class ImportApiData:
@@ -9,75 +15,165 @@ class ImportApiData:
     A class used to import pharmacy data from an XML API.
     """
 
-    def __init__(self, api_url):
+    def __init__(self, api_url, timeout=10, retries=3, xml_file=None):
         """
         Initializes the ImportApiData object with an API URL.
 
         Args:
             api_url (str): The URL of the XML API.
+            timeout (float): The connect and read timeout for the API in seconds.
+            retries (int): How often a failed request is retried.
+            xml_file (str, optional): The file the raw XML is saved to. Defaults to XML_FILE.
         """
         self.api_url = api_url
+        self.xml_file = xml_file or os.getenv('XML_FILE')
+        self.timeout = timeout
+        self.retries = retries
+        self.etag = None
+        self.last_modified = None
+        self._session = None
+
+    @property
+    def session(self):
+        """
+        The HTTP session, created with the first request, so requests is not even
+        imported by runs that never call the API (e.g. TEST_MODE).
+        """
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # One session for all requests, so the connection is kept alive
+            session = requests.Session()
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            retry = Retry(total=self.retries, backoff_factor=0.5,
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=("GET",))
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            session.mount("http://", HTTPAdapter(max_retries=retry))
+            self._session = session
+        return self._session
+
+    def fetch(self):
+        """
+        Fetches the raw XML from the API, sending the validators of the last response.
+
+        Returns:
+            bytes: The XML data, None if the data has not been modified since the
+                last request, or b"" if the request failed.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        session = self.session
+        from requests import RequestException
+
+        try:
+            with metrics.stage("fetch"):
+                response = session.get(self.api_url, headers=headers, timeout=self.timeout)
+        except RequestException as e:
+            logger.error("Failed to retrieve data from API: %s", e)
+            return b""
+        if response.status_code == 304:
+            logger.info("API data not modified since last request.")
+            metrics.cache("http", hit=True)
+            return None
+        if response.status_code != 200:
+            logger.error("Failed to retrieve data from API. Status code: %d", response.status_code)
+            return b""
+
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        metrics.cache("http", hit=False)
+        metrics.add_bytes("fetch", len(response.content))
+        return response.content
+
+    def load(self):
+        """
+        Loads the raw XML, from TEST_XML_FILE in test mode or from the API otherwise.
+
+        Returns:
+            bytes: The XML data, None if the data has not been modified since the
+                last request, or b"" if the request failed.
+        """
+        if os.getenv('TEST_MODE') == 'True':
+            with metrics.stage("fetch"), open(os.getenv('TEST_XML_FILE'), "rb") as f: # type: ignore
+                xml_data = f.read()
+            metrics.add_bytes("fetch", len(xml_data))
+            return xml_data
+        return self.fetch()
 
     def import_data(self):
         """
         Imports data from the XML API.
 
         Returns:
-            list: A list of dictionaries containing pharmacy data.
+            list: A list of Pharmacy records, or None if the data has not been
+                modified since the last call or could not be retrieved.
         """
-        xml_file=os.getenv('XML_FILE')
+        xml_data = self.load()
+        if not xml_data:
+            return None
+        return self.parse(xml_data)
 
-        if os.getenv('TEST_MODE') == 'True':
-            test_xml_file = os.getenv('TEST_XML_FILE')
-            xml_root = etree.parse(source=test_xml_file).getroot() # type: ignore
-        else:
-            response = requests.get(self.api_url)
-            if response.status_code != 200:
-                print(f"Failed to retrieve data from API. Status code: {response.status_code}")
-                return []
-            xml_data = response.content
-            xml_root = etree.fromstring(xml_data) # type: ignore
-        try:
-            with open(xml_file, "wb") as f: # type: ignore
-                f.write(etree.tostring(xml_root, pretty_print=True, encoding='utf-8')) # type: ignore
-                print(f"XML saved to {xml_file}")
-        except IOError as e:
-            print(f"An error occurred while saving XML data to {xml_file}: {e}") # type: ignore
+    def parse(self, xml_data):
+        """
+        Parses the pharmacy entries and saves the raw XML to the XML file, once it
+        has parsed cleanly.
 
+        Args:
+            xml_data (bytes): The XML data as loaded from the API.
 
-        print(etree.tostring(xml_root, pretty_print=True).decode()) # type: ignore
+        Returns:
+            list: A list of Pharmacy records.
+        """
+        with metrics.stage("parse"):
+            pharmacy_list = list(self.iter_entries(xml_data))
+        metrics.add_bytes("parse", len(xml_data))
+        metrics.set_gauge("parsed_entries", len(pharmacy_list))
+        logger.info("Parsed %d entries from %d bytes of XML", len(pharmacy_list), len(xml_data))
+        dump_payload("API XML", xml_data)
+        self.save_xml_to_file(xml_data, self.xml_file)
+        return pharmacy_list
 
-        pharmacy_list = []
+    @staticmethod
+    def iter_entries(xml_data):
+        """
+        Parses the pharmacy entries incrementally, without building the whole tree.
 
-        for entry_element in xml_root.findall(".//entries/entry"):
-            pharmacy_data = {
-                "id": entry_element.find("id").text,
-                "from": entry_element.find("from").text,
-                "to": entry_element.find("to").text,
-                "name": entry_element.find("name").text,
-                "street": entry_element.find("street").text,
-                "zipCode": entry_element.find("zipCode").text,
-                "location": entry_element.find("location").text,
-                "subLocation": entry_element.find("subLocation").text,
-                "phone": entry_element.find("phone").text,
-                "lat": float(entry_element.find("lat").text),
-                "lon": float(entry_element.find("lon").text),
-            }
+        Every finished entry element is cleared and dropped from its parent, so the
+        memory use stays flat even for state-wide feeds.
 
-            pharmacy_list.append(pharmacy_data)
+        Args:
+            xml_data (bytes): The XML data as loaded from the API.
 
-        return pharmacy_list
+        Yields:
+            Pharmacy: The pharmacy data of one entry.
+        """
+        from lxml import etree
 
-    # def save_xml_to_file(self, xml_data, filename):
-    #     """
-    #     Save XML data to a file.
+        for _, entry_element in etree.iterparse(BytesIO(xml_data), events=("end",), tag="entry"):
+            yield Pharmacy.from_fields({child.tag: child.text for child in entry_element})
 
-    #     Args:
-    #         xml_data (str): The XML data to be saved.
-    #         filename (str, optional): The name of the file to save the data to. Defaults to "data.xml".
-    #     """
+            entry_element.clear()
+            while entry_element.getprevious() is not None:
+                del entry_element.getparent()[0]
 
-    #     with open(filename, "w", encoding="utf-8") as f:
-    #         f.write(xml_data.decode())
-    #     print(f"XML data saved to '{filename}' file.")
+    def save_xml_to_file(self, xml_data, filename):
+        """
+        Save XML data to a file, exactly as received.
 
+        Args:
+            xml_data (bytes): The XML data to be saved.
+            filename (str): The name of the file to save the data to.
+        """
+        try:
+            with open(filename, "wb") as f:
+                f.write(xml_data)
+                logger.info("XML saved to %s", filename)
+        except IOError as e:
+            logger.error("An error occurred while saving XML data to %s: %s", filename, e)
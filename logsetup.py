@@ -0,0 +1,61 @@
+import os
+import logging
+
+# The logger of the full payloads (XML, entries, HTML), written to rotating files only
+payload_logger = logging.getLogger("notdienst.payload")
+
+
+def setup_logging(level="INFO", log_dir="logs", max_bytes=10 * 1024 * 1024, backup_count=5):
+    """
+    Configures the logging of the process.
+
+    Only summaries are logged to stderr. At the DEBUG level the full payloads are
+    additionally dumped to a rotating file in log_dir, never to stderr, so the
+    journal does not grow with the size of the feed.
+
+    Args:
+        level (str): The name of the log level, e.g. "INFO" or "DEBUG".
+        log_dir (str): The directory of the payload log.
+        max_bytes (int): The size at which the payload log is rotated.
+        backup_count (int): The number of rotated payload logs to keep.
+    """
+    level = logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    payload_logger.propagate = False
+    payload_logger.setLevel(level)
+    if level <= logging.DEBUG and not payload_logger.handlers:
+        from logging.handlers import RotatingFileHandler
+
+        os.makedirs(log_dir, exist_ok=True)
+        handler = RotatingFileHandler(os.path.join(log_dir, "payload.log"), maxBytes=max_bytes,
+                                      backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        payload_logger.addHandler(handler)
+
+
+def dump_payload(description, payload):
+    """
+    Dumps a payload to the payload log, if the DEBUG level is enabled.
+
+    Args:
+        description (str): What the payload is, e.g. "API XML".
+        payload (str, bytes or callable): The payload, or a callable returning it, so
+            it is only built when it is logged.
+    """
+    if not payload_enabled():
+        return
+    if callable(payload):
+        payload = payload()
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8", errors="replace")
+    payload_logger.debug("%s:\n%s", description, payload)
+
+
+def payload_enabled():
+    """
+    Returns True if the payloads are dumped to the payload log.
+    """
+    return payload_logger.isEnabledFor(logging.DEBUG) and bool(payload_logger.handlers)
@@ -0,0 +1,138 @@
+import logging
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """
+    A class used to collect per-stage timings and counters of the refresh cycles.
+
+    The stages are fetch, parse, transform, render and write. The values can be
+    exported as Prometheus text and written as one JSON line per cycle.
+    """
+
+    def __init__(self):
+        """
+        Initializes the Metrics object.
+        """
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_count = {}
+        self.stage_last_seconds = {}
+        self.stage_bytes = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self.gauges = {}
+        self.cycle = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage with the monotonic performance counter.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                self.stage_count[name] = self.stage_count.get(name, 0) + 1
+                self.stage_last_seconds[name] = elapsed
+                self.cycle[f"{name}_seconds"] = self.cycle.get(f"{name}_seconds", 0.0) + elapsed
+
+    def add_bytes(self, stage, count):
+        """
+        Adds the number of bytes handled by a stage.
+        """
+        with self._lock:
+            self.stage_bytes[stage] = self.stage_bytes.get(stage, 0) + count
+            self.cycle[f"{stage}_bytes"] = self.cycle.get(f"{stage}_bytes", 0) + count
+
+    def cache(self, name, hit):
+        """
+        Counts a hit or a miss of a cache or change check.
+
+        Args:
+            name (str): The name of the cache, e.g. "http", "body" or "qr_code".
+            hit (bool): True if the cached result could be used.
+        """
+        counters = self.cache_hits if hit else self.cache_misses
+        with self._lock:
+            counters[name] = counters.get(name, 0) + 1
+            key = f"{name}_{'hits' if hit else 'misses'}"
+            self.cycle[key] = self.cycle.get(key, 0) + 1
+
+    def set_gauge(self, name, value):
+        """
+        Sets a gauge, e.g. the number of parsed entries.
+        """
+        with self._lock:
+            self.gauges[name] = value
+            self.cycle[name] = value
+
+    def end_cycle(self, jsonl_file=None):
+        """
+        Finishes a refresh cycle and starts collecting the next one.
+
+        Args:
+            jsonl_file (str, optional): A file the values of the cycle are appended
+                to as one JSON line.
+
+        Returns:
+            dict: The values collected during the cycle.
+        """
+        with self._lock:
+            cycle, self.cycle = self.cycle, {}
+        cycle["time"] = datetime.now(timezone.utc).isoformat()
+        if jsonl_file:
+            try:
+                with open(jsonl_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(cycle, sort_keys=True) + "\n")
+            except IOError as e:
+                logger.error("An error occurred while writing metrics to %s: %s", jsonl_file, e)
+        return cycle
+
+    def render_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def family(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        with self._lock:
+            lines.append("# HELP notdienst_stage_seconds Time spent in a pipeline stage.")
+            lines.append("# TYPE notdienst_stage_seconds summary")
+            for stage in sorted(self.stage_seconds):
+                lines.append(f'notdienst_stage_seconds_sum{{stage="{stage}"}} {self.stage_seconds[stage]}')
+                lines.append(f'notdienst_stage_seconds_count{{stage="{stage}"}} {self.stage_count[stage]}')
+            family("notdienst_stage_last_seconds", "gauge", "Duration of the last run of a stage.",
+                   [({"stage": stage}, value) for stage, value in sorted(self.stage_last_seconds.items())])
+            family("notdienst_stage_bytes_total", "counter", "Bytes handled by a stage.",
+                   [({"stage": stage}, value) for stage, value in sorted(self.stage_bytes.items())])
+            family("notdienst_cache_hits_total", "counter", "Cache and change check hits.",
+                   [({"cache": name}, value) for name, value in sorted(self.cache_hits.items())])
+            family("notdienst_cache_misses_total", "counter", "Cache and change check misses.",
+                   [({"cache": name}, value) for name, value in sorted(self.cache_misses.items())])
+            for name, value in sorted(self.gauges.items()):
+                family(f"notdienst_{name}", "gauge", name.replace("_", " ").capitalize() + ".",
+                       [({}, value)])
+        return "\n".join(lines) + "\n"
+
+
+# The metrics of this process, shared by all stages
+metrics = Metrics()
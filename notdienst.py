@@ -33,17 +33,37 @@ import os
 import json
 import time
 import html
-
-from datetime import datetime
+import hashlib
+import signal
+import logging
+import sqlite3
+
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 # from playwright.sync_api import sync_playwright
 
 from importapidata import ImportApiData
 from htmlcreator import HtmlCreator
+from refreshscheduler import RefreshScheduler, RefreshIncomplete
+from changedetector import ChangeDetector, normalize_entries
+from geo import nearest_pharmacies
+from siteconfig import load_sites
+from rosterindex import RosterIndex
+from rosterstore import RosterStore
+from rosterexporter import RosterExporter
+from feed import Feed, FeedError
+from qrcache import QrCodeCache, make_qr_code, maps_url
+from metrics import metrics
+from cycleprofiler import CycleProfiler
+from logsetup import setup_logging, dump_payload
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger("notdienst")
+
 yesterday_json_data = ""
 today_json_data = ""
 
@@ -54,23 +74,14 @@ def generate_location_qr_code(lat, lon, filename="location_qr_code.png"):
     Parameters:
     lat (float): Latitude in degrees.
     lon (float): Longitude in degrees.
-    filename (str): The name of the output image file. Defaults to "location_qr_code.png".
+    filename (str): The name of the output image file, ".png" or ".svg". Defaults to "location_qr_code.png".
     """
-    import qrcode
-
     # Google Maps URL format
-    google_maps_url = f"https://www.google.com/maps?q={lat},{lon}"
+    image_format = "svg" if filename.endswith(".svg") else "png"
+    with open(filename, "wb") as f:
+        f.write(make_qr_code(maps_url(lat, lon), image_format))
 
-    # Generate QR Code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(google_maps_url)
-    qr.make(fit=True)
-
-    # Create an image of the QR code
-    img = qr.make_image(fill_color="black", back_color="white")
-    img.save(filename)
-
-    print(f"QR Code generated and saved as '{filename}'")
+    logger.info("QR Code generated and saved as '%s'", filename)
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -108,55 +119,542 @@ def haversine(lat1, lon1, lat2, lon2):
 
 
 
-def main():
+def import_feed(feed, xml_data):
+    """
+    Import the pharmacy data of one feed, unless it is unchanged since the last cycle.
 
-    # Load environment variables from .env file
-    html_page = os.getenv("HTML_PAGE")
-    html_title = os.getenv("HTML_TITLE")
-    html_logo_left = os.getenv("HTML_LOGO_LEFT")
-    html_logo_right = os.getenv("HTML_LOGO_RIGHT")
-    html_template = os.getenv("HTML_TEMPLATE")
+    Parsing is skipped as soon as the change detector finds the raw XML unchanged,
+    rendering as soon as it finds the parsed entries unchanged.
 
-    lat_here = os.getenv("LAT_HERE")
-    lon_here = os.getenv("LON_HERE")
+    Parameters:
+    feed (Feed): The feed.
+    xml_data (bytes): The result of ImportApiData.load() for the feed.
 
-    api_url = os.getenv("API_URL")
-    
-    importer = ImportApiData(api_url)
-    pharmacy_list = importer.import_data()
-    print(pharmacy_list)
+    Returns:
+    list: The Pharmacy records, or None if nothing needs to be rendered.
+
+    Raises:
+    FeedError: If the fetch failed or the data does not parse; the current
+        pages stay as they are.
+    """
+    change_detector = feed.change_detector
+    if xml_data is None:
+        # Nothing changed upstream, the current pages are still valid
+        return None
+    if not xml_data:
+        # A failed fetch never replaces a roster, the current pages stay as they are
+        raise FeedError("No data from the API")
+    if not change_detector.changed("body", xml_data):
+        logger.info("XML data unchanged, skipping parse and render.")
+        # The digests stay the same, but the validators of the response may be new
+        feed.commit()
+        return None
+
+    try:
+        pharmacy_list = feed.importer.parse(xml_data)
+    except (SyntaxError, KeyError, ValueError, TypeError) as e:
+        # Only data that parses cleanly replaces the current pages
+        change_detector.forget("body")
+        raise FeedError(f"Failed to parse the API data: {e}") from e
+    if not change_detector.changed("entries", normalize_entries(pharmacy_list)):
+        logger.info("Pharmacy entries unchanged, skipping render.")
+        # Nothing to render, so the new body is handled already
+        feed.commit()
+        return None
 
     # importer.save_xml_to_file(pharmacy_list, os.getenv("JSON_FILE"))
 
     # Check if any pharmacies were extracted
     if pharmacy_list:
-        print("Extracted pharmacy data (before sorting):")
-        for pharmacy in pharmacy_list:
-            print(pharmacy)
+        logger.info("Extracted %d pharmacies.", len(pharmacy_list))
+        dump_payload("Extracted pharmacy data", lambda: "\n".join(map(repr, pharmacy_list)))
+    else:
+        logger.warning("No pharmacy data found.")
+    return pharmacy_list
 
-        # Sort the pharmacy list by distance
-        # sorted_pharmacy_list = sort_pharmacies_by_distance(pharmacy_list)
+def render_site(site, html_creator, roster, now, server=None, start_page=False):
+    """
+    Render the HTML page of one display site.
 
-        # print("\nPharmacy data sorted by distance:")
-        # for pharmacy in sorted_pharmacy_list:
-        #     print(pharmacy)
+    Parameters:
+    site (Site): The display site.
+    html_creator (HtmlCreator): The creator for the HTML page of the site.
+    roster (RosterIndex): The roster of the feed of the site.
+    now (datetime): The (timezone aware) time of the refresh.
+    server (DisplayServer): The built-in server to hand the new page to, if any.
+    start_page (bool): Whether "/" redirects to the page.
+    """
+    start = time.perf_counter()
+
+    with metrics.stage("transform"):
+        if site.display_mode == "current":
+            # Only the shift on duty now and the one starting next, few enough to sort them all
+            pharmacy_list = roster.on_duty(now) + roster.next_shift(now)
+            if site.origin is not None:
+                pharmacy_list = nearest_pharmacies(pharmacy_list, *site.origin)
+                if site.radius_km is not None:
+                    pharmacy_list = [pharmacy for pharmacy in pharmacy_list
+                                     if pharmacy.distance <= site.radius_km]
+        elif site.origin is not None:
+            # Select the pharmacies closest to the display from the grid of the whole roster
+            if site.radius_km is not None:
+                pharmacy_list = roster.spatial.within(*site.origin, site.radius_km, max_rows=site.max_rows)
+            elif site.max_rows is not None:
+                pharmacy_list = roster.spatial.nearest(*site.origin, site.max_rows)
+            else:
+                pharmacy_list = nearest_pharmacies(roster.pharmacy_list, *site.origin)
+        else:
+            pharmacy_list = roster.pharmacy_list
+
+        if site.max_rows is not None:
+            pharmacy_list = pharmacy_list[:site.max_rows]
+
+    if server is None:
+        # Render the html page straight into the specified file
+        html_creator.render_to_file(pharmacy_list)
+        html_creator.save_data_to_file(html_creator.create_data())
     else:
-        print("No pharmacy data found.")
-
-    # Create an HTML page using Jinja2 template
-    html_creator = HtmlCreator(html_page, html_title, html_logo_left, html_logo_right, html_template)
-    # Create the content, of the html page
-    for pharmacy in pharmacy_list:
-        from_date = datetime.strptime(pharmacy["from"], "%Y-%m-%dT%H:%M:%S.%f+00:00")
-        to_date = datetime.strptime(pharmacy["to"], "%Y-%m-%dT%H:%M:%S.%f+00:00")
-        
-        pharmacy["from"] = from_date.strftime("%d.%m.%y %H:%M")
-        pharmacy["to"] = to_date.strftime("%d.%m.%y %H:%M")
-
-    html_page_detail_content = html_creator.create_html(pharmacy_list)
-
-    # Save the HTML page content to the specified file
-    html_creator.save_html_to_file(html_page_detail_content)
+        # Keep the rendered page in memory for the built-in server as well
+        html_page_content = html_creator.create_html(pharmacy_list)
+        data_content = html_creator.create_data()
+        html_creator.save_html_to_file(html_page_content)
+        html_creator.save_data_to_file(data_content)
+        serve_page(server, html_creator, html_page_content, data_content, start_page)
+    html_creator.rendered_at = now
+
+    logger.info("Site %s: rendered %d pharmacies in %.1f ms",
+                site.name, len(pharmacy_list), (time.perf_counter() - start) * 1000)
+
+def needs_render(site, html_creator, roster, imported, now):
+    """
+    Check whether the page of a site has to be rendered in this cycle.
+
+    Parameters:
+    site (Site): The display site.
+    html_creator (HtmlCreator): The creator for the HTML page of the site.
+    roster (RosterIndex): The roster of the feed of the site.
+    imported (bool): Whether the feed of the site brought new entries.
+    now (datetime): The (timezone aware) time of the refresh.
+
+    Returns:
+    bool: True if the page is outdated.
+    """
+    if imported or html_creator.rendered_at is None:
+        return True
+    qr_codes = html_creator.qr_codes
+    if qr_codes is not None and qr_codes.generated_at is not None \
+            and qr_codes.generated_at > html_creator.rendered_at:
+        # QR codes finished in the background since the last render
+        return True
+    if site.display_mode == "current":
+        # The shown shifts change whenever a boundary has passed since the last render
+        boundary = roster.next_boundary(html_creator.rendered_at)
+        return boundary is not None and boundary <= now
+    return False
+
+class Refresher:
+    """
+    A class used to run the refresh cycles and keep their state warm in between.
+    """
+
+    def __init__(self, feeds, renderers, render_executor, fetch_executor, store=None,
+                 fetch_deadline=30, metrics_jsonl=None, profiler=None, exporters=()):
+        """
+        Initializes the Refresher object.
+
+        Parameters:
+        feeds (dict): The Feed of every distinct API URL.
+        renderers (list): The (Site, HtmlCreator) pair of every display site.
+        render_executor (Executor): The pool the site pages are rendered in.
+        fetch_executor (Executor): The pool the feeds are fetched in.
+        store (RosterStore): The local roster store, if any.
+        fetch_deadline (float): The seconds a cycle waits for the fetches at most.
+        metrics_jsonl (str): The file the metrics of every cycle are appended to, if any.
+        profiler (CycleProfiler): The profiler of the cycles on request, if any.
+        exporters (list): The (Site, RosterExporter) pair of every site with exports.
+        """
+        self.feeds = feeds
+        self.renderers = renderers
+        self.render_executor = render_executor
+        self.fetch_executor = fetch_executor
+        self.store = store
+        self.fetch_deadline = fetch_deadline
+        self.metrics_jsonl = metrics_jsonl
+        self.profiler = profiler
+        self.exporters = list(exporters)
+        self.rosters = {}
+        self.merged_rosters = {}
+        self.server = None
+
+    def roster_for(self, site):
+        """
+        Return the roster shown by a site: the roster of its feed, or the merged
+        rosters of its feeds.
+
+        Parameters:
+        site (Site): The display site.
+
+        Returns:
+        RosterIndex: The roster, or None if none of its feeds is loaded yet.
+        """
+        rosters = tuple(self.rosters[api_url] for api_url in site.api_urls if api_url in self.rosters)
+        if len(rosters) <= 1:
+            return rosters[0] if rosters else None
+        # The merged roster is kept until one of the feeds brings a new roster
+        cached = self.merged_rosters.get(site.api_urls)
+        if cached is None or cached[0] != rosters:
+            with metrics.stage("transform"):
+                cached = (rosters, RosterIndex.merge(rosters))
+            self.merged_rosters[site.api_urls] = cached
+        return cached[1]
+
+    def render_sites(self, imported, now):
+        """
+        Render the pages of all sites that are outdated, concurrently.
+
+        Parameters:
+        imported (set): The API URLs that brought new entries in this cycle.
+        now (datetime): The (timezone aware) time of the refresh.
+        """
+        # The sites share the parsed entries of their feeds and are rendered concurrently
+        futures = []
+        for index, (site, html_creator) in enumerate(self.renderers):
+            roster = self.roster_for(site)
+            site_imported = any(api_url in imported for api_url in site.api_urls)
+            if roster is not None and needs_render(site, html_creator, roster, site_imported, now):
+                futures.append(self.render_executor.submit(self.wrap(render_site), site, html_creator,
+                                                           roster, now, self.server, index == 0))
+        for future in futures:
+            future.result()
+
+    def export_sites(self, imported):
+        """
+        Export the rosters of the sites whose feeds brought new entries, concurrently.
+
+        Parameters:
+        imported (set): The API URLs that brought new entries in this cycle.
+        """
+        # All formats of all sites are written from the rosters in memory at once
+        futures = []
+        for site, exporter in self.exporters:
+            roster = self.roster_for(site)
+            site_imported = any(api_url in imported for api_url in site.api_urls)
+            if roster is not None and (site_imported or not exporter.exported):
+                futures.append((exporter, exporter.submit(roster.entries, self.render_executor,
+                                                          self.wrap)))
+        for exporter, format_futures in futures:
+            for future in format_futures:
+                future.result()
+            exporter.exported = True
+
+    def restore(self, now):
+        """
+        Restore the rosters not yet in memory from the snapshots or the store.
+
+        Parameters:
+        now (datetime): The (timezone aware) time of the refresh.
+
+        Returns:
+        bool: True if any roster was restored.
+        """
+        restored = False
+        for api_url, feed in self.feeds.items():
+            if api_url in self.rosters:
+                continue
+            pharmacy_list = feed.load_snapshot()
+            if not pharmacy_list and self.store is not None:
+                try:
+                    pharmacy_list = self.store.load(api_url, since=now)
+                except sqlite3.Error as e:
+                    logger.error("Roster store: could not load %s: %s", api_url, e)
+            if pharmacy_list:
+                self.rosters[api_url] = RosterIndex(pharmacy_list)
+                restored = True
+        return restored
+
+    def wrap(self, function):
+        """
+        Return the function to submit to a pool, profiled if the cycle is profiled.
+        """
+        return self.profiler.wrap(function) if self.profiler is not None else function
+
+    def refresh(self):
+        """
+        Run one refresh cycle and record its metrics.
+
+        Returns:
+        datetime: The next shift boundary of the rosters, or None.
+        """
+        profiling = self.profiler.cycle() if self.profiler is not None else nullcontext()
+        try:
+            with profiling, metrics.stage("cycle"):
+                return self.run_cycle()
+        finally:
+            metrics.set_gauge("rosters", len(self.rosters))
+            metrics.end_cycle(self.metrics_jsonl)
+
+    def run_cycle(self):
+        """
+        Run one refresh cycle: import every feed once and render the pages of all sites.
+
+        The pages are rendered from the last good roster first (stale), while the
+        feeds are fetched in the background (revalidate). Fresh data only replaces
+        a page once it has arrived within the fetch deadline and parsed cleanly.
+
+        Returns:
+        datetime: The next shift boundary of the rosters, or None.
+
+        Raises:
+        RefreshIncomplete: If a feed failed or is still fetching, after the pages of
+            the others are rendered, so the cycle is retried with backoff.
+        """
+        now = datetime.now(timezone.utc)
+        deadline = time.monotonic() + self.fetch_deadline
+        pending = {feed.start_fetch(self.fetch_executor, self.wrap): api_url
+                   for api_url, feed in self.feeds.items()}
+
+        # Render from the last good roster first, so the pages do not wait for the API
+        if self.restore(now):
+            self.render_sites(set(), now)
+
+        imported = set()
+        failed = {}
+        try:
+            # Parse every feed as soon as it has arrived, so the cycle only waits for the slowest
+            for future in as_completed(pending, timeout=max(0, deadline - time.monotonic())):
+                api_url = pending[future]
+                feed = self.feeds[api_url]
+                try:
+                    xml_data = feed.take_fetch(timeout=0)
+                    pharmacy_list = import_feed(feed, xml_data)
+                except Exception as e:
+                    # One failing feed must not keep the others from being imported
+                    logger.error("Importing %s failed, keeping the last known roster: %s", api_url, e)
+                    failed[api_url] = str(e)
+                    continue
+                if pharmacy_list is None and api_url not in self.rosters:
+                    # Unchanged, but the roster is lost (e.g. the snapshot was deleted),
+                    # so the next cycle fetches and parses the feed again
+                    feed.forget()
+                    failed[api_url] = "unchanged, but no roster is loaded"
+                    continue
+                if pharmacy_list is not None:
+                    with metrics.stage("transform"):
+                        self.rosters[api_url] = RosterIndex(pharmacy_list)
+                    imported.add(api_url)
+                    if self.store is not None:
+                        try:
+                            logger.info("Roster store: %d entries changed",
+                                        self.store.upsert(api_url, pharmacy_list))
+                        except sqlite3.Error as e:
+                            # The store is only a fallback, it must never keep the pages from rendering
+                            logger.error("Roster store: could not save %s: %s", api_url, e)
+        except FuturesTimeoutError:
+            for future, api_url in pending.items():
+                if not future.done():
+                    logger.warning("Fetching %s takes too long, keeping the last known roster.", api_url)
+                    failed[api_url] = "still fetching at the deadline"
+
+        self.render_sites(imported, now)
+        self.export_sites(imported)
+
+        # Only remember the new entries once all their pages are rendered
+        for api_url in imported:
+            feed = self.feeds[api_url]
+            feed.commit()
+            feed.save_snapshot(self.rosters[api_url].pharmacy_list)
+
+        # Wake up exactly at the next boundary, when the shown shifts change
+        boundaries = [roster.next_boundary(now) for roster in self.rosters.values()]
+        next_boundary = min(filter(None, boundaries), default=None)
+        metrics.set_gauge("failed_feeds", len(failed))
+        if failed:
+            raise RefreshIncomplete(f"{len(failed)} of {len(self.feeds)} feeds not up to date: "
+                                    + "; ".join(f"{api_url}: {reason}" for api_url, reason in failed.items()),
+                                    next_boundary)
+        return next_boundary
+
+def serve_page(server, html_creator, html_page_content, data_content=None, start_page=False):
+    """
+    Hand a rendered page and its table data to the built-in server.
+
+    Parameters:
+    server (DisplayServer): The built-in server.
+    html_creator (HtmlCreator): The creator of the page.
+    html_page_content (str): The rendered page.
+    data_content (str): The JSON table data polled by the page, if any.
+    start_page (bool): Whether "/" redirects to the page.
+    """
+    data_type = "application/json; charset=utf-8"
+    page_path = server.url_path(html_creator.html_page)
+    server.update(page_path, html_page_content)
+    if data_content is not None:
+        server.update(server.url_path(html_creator.data_file), data_content, data_type)
+    if start_page:
+        # The data, assets and QR codes are referenced relative to the page, so
+        # "/" redirects to its path instead of serving the page itself
+        server.redirects["/"] = page_path
+
+def static_dirs(renderers):
+    """
+    Return the directories the built-in server serves files from: the directories
+    of the pages, of their assets and of their QR codes.
+
+    Parameters:
+    renderers (list): The (Site, HtmlCreator) pair of every display site.
+
+    Returns:
+    set: The directories.
+    """
+    directories = set()
+    for site, html_creator in renderers:
+        directories.add(os.path.dirname(os.path.abspath(site.html_page)))
+        directories.add(html_creator.assets.asset_dir)
+        if html_creator.qr_codes is not None:
+            directories.add(html_creator.qr_codes.cache_dir)
+    return directories
+
+def main():
+
+    # Log summaries only; LOG_LEVEL=DEBUG dumps the payloads to rotating files in LOG_DIR
+    setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_DIR", "logs"),
+                  max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+                  backup_count=int(os.getenv("LOG_BACKUPS", "5")))
+
+    # Load the display sites from SITES_FILE, or the single site of the .env file
+    sites = load_sites(os.getenv("SITES_FILE"))
+    xml_file = os.getenv("XML_FILE", "data/data.xml")
+    api_timeout = float(os.getenv("API_TIMEOUT", "10"))
+
+    # Every distinct API URL is fetched and parsed only once per cycle
+    feeds = {}
+    for api_url in dict.fromkeys(api_url for site in sites for api_url in site.api_urls):
+        # The files of a feed are named after its URL, so they stay with the feed
+        # when the sites file is reordered
+        root, ext = os.path.splitext(xml_file)
+        url_hash = hashlib.sha256((api_url or "").encode()).hexdigest()[:8]
+        feed_xml_file = f"{root}-{url_hash}{ext}"
+        importer = ImportApiData(api_url, timeout=api_timeout, xml_file=feed_xml_file)
+        # The digests of the last cycle and the last good roster are kept next to the XML dump
+        change_detector = ChangeDetector(f"{feed_xml_file}.state.json")
+        if any(site.display_mode == "current" and api_url in site.api_urls for site in sites):
+            # The shown shifts depend on the time, so the roster must be parsed once
+            change_detector.forget("body")
+            change_detector.forget("entries")
+        feeds[api_url] = Feed(importer, change_detector, f"{feed_xml_file}.snapshot.pickle")
+
+    # The local roster store keeps the entries across restarts and API outages
+    roster_db = os.getenv("ROSTER_DB")
+    store = RosterStore(roster_db) if roster_db else None
+
+    # Create the HTML pages using Jinja2 templates
+    precompress = [encoding for encoding in os.getenv("PRECOMPRESS", "").split(",") if encoding]
+    qr_dir = os.getenv("QR_DIR")
+    qr_codes = QrCodeCache(qr_dir, os.getenv("QR_FORMAT", "png")) if qr_dir else None
+    renderers = [(site, HtmlCreator(site.html_page, site.html_title, site.html_logo_left,
+                                    site.html_logo_right, site.html_template,
+                                    precompress=precompress, qr_codes=qr_codes))
+                 for site in sites]
+
+    # The roster is also exported for other consumers, e.g. EXPORT_FORMATS=json,csv,ics
+    export_formats = [name for name in os.getenv("EXPORT_FORMATS", "").split(",") if name]
+    exporters = [(site, RosterExporter(os.path.splitext(site.html_page)[0] + "-roster", export_formats,
+                                       precompress=precompress))
+                 for site in sites] if export_formats else []
+
+    # SIGUSR1 or the /profile endpoint profile the next cycles, PROFILE=True the first ones
+    profiler = CycleProfiler(os.getenv("PROFILE_DIR", "profiles"),
+                             cycles=int(os.getenv("PROFILE_CYCLES", "3")))
+    if os.getenv("PROFILE") == "True":
+        profiler.request()
+
+    render_workers = int(os.getenv("RENDER_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix="render") as render_executor, \
+            ThreadPoolExecutor(max_workers=min(len(feeds), int(os.getenv("FETCH_WORKERS", "8"))),
+                               thread_name_prefix="fetch") as fetch_executor:
+        refresher = Refresher(feeds, renderers, render_executor, fetch_executor, store,
+                              fetch_deadline=float(os.getenv("FETCH_DEADLINE", "30")),
+                              metrics_jsonl=os.getenv("METRICS_JSONL"), profiler=profiler,
+                              exporters=exporters)
+        if os.getenv("DAEMON_MODE") == "True":
+            run_daemon(refresher)
+        else:
+            try:
+                refresher.refresh()
+            except RefreshIncomplete as e:
+                # The respawn loop of startNotdienst.sh retries with the next run
+                logger.warning("Refresh incomplete: %s", e)
+    if store is not None:
+        store.close()
+    if qr_codes is not None:
+        qr_codes.close()
+
+def run_daemon(refresher):
+    """
+    Stay resident and refresh on schedule instead of being respawned.
+
+    Parameters:
+    refresher (Refresher): The refresher running the cycles.
+    """
+    # The server (and asyncio) is only needed by the resident process
+    from displayserver import DisplayServer
+
+    scheduler = RefreshScheduler(
+        refresh_interval=int(os.getenv("REFRESH_INTERVAL", "900")),
+        shift_change=os.getenv("SHIFT_CHANGE", "08:30"),
+        jitter=int(os.getenv("REFRESH_JITTER", "30")),
+        retry_delay=int(os.getenv("RETRY_DELAY", "30")),
+        max_backoff=int(os.getenv("MAX_BACKOFF", "900")),
+    )
+    if refresher.profiler is not None and hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid> profiles the next cycles without a restart
+        signal.signal(signal.SIGUSR1, refresher.profiler.handle_signal)
+
+    server = None
+    if os.getenv("SERVER_MODE") == "True":
+        # Serve the pages from memory instead of running python -m http.server
+        server = DisplayServer(
+            host=os.getenv("SERVER_HOST", "0.0.0.0"),
+            port=int(os.getenv("SERVER_PORT", "8080")),
+            document_root=os.getenv("SERVER_ROOT", "."),
+            static_dirs=static_dirs(refresher.renderers),
+            expires_at=lambda: scheduler.next_refresh,
+        )
+        # Serve the last published pages until the first refresh renders new ones
+        for index, (site, html_creator) in enumerate(refresher.renderers):
+            if os.path.exists(site.html_page):
+                with open(site.html_page, "r", encoding="utf-8") as f:
+                    html_page_content = f.read()
+                data_content = None
+                if os.path.exists(html_creator.data_file):
+                    with open(html_creator.data_file, "r", encoding="utf-8") as f:
+                        data_content = f.read()
+                serve_page(server, html_creator, html_page_content, data_content, index == 0)
+        server.start()
+        refresher.server = server
+
+    metrics_server = None
+    if os.getenv("METRICS_PORT"):
+        # Prometheus scrapes the metrics from a separate, by default local only, port
+        metrics_server = DisplayServer(
+            host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            port=int(os.getenv("METRICS_PORT")),
+            document_root=None,
+        )
+        metrics_server.handlers["/metrics"] = lambda: ("text/plain; version=0.0.4; charset=utf-8",
+                                                       metrics.render_prometheus())
+        if refresher.profiler is not None:
+            metrics_server.handlers["/profile"] = lambda: ("text/plain; charset=utf-8",
+                                                           refresher.profiler.request())
+        metrics_server.start()
+
+    try:
+        scheduler.run(refresher.refresh)
+    finally:
+        if server is not None:
+            server.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
 
 # Run the script
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import copy
+from datetime import datetime
+
+
+class Pharmacy:
+    """
+    A compact record of one emergency service entry of the feed.
+
+    The service times are parsed once into timezone aware datetimes; the display
+    strings are only formatted when the page asks for them.
+    """
+
+    __slots__ = ("id", "from_date", "to_date", "name", "street", "zip_code", "location",
+                 "sub_location", "phone", "lat", "lon", "distance", "_from_text", "_to_text")
+
+    DISPLAY_FORMAT = "%d.%m.%y %H:%M"
+
+    def __init__(self, id, from_date, to_date, name, street, zip_code, location,
+                 sub_location, phone, lat, lon):
+        """
+        Initializes the Pharmacy object.
+
+        Args:
+            id (str): The stable id of the entry.
+            from_date (datetime): The start of the service.
+            to_date (datetime): The end of the service.
+            name (str): The name of the pharmacy.
+            street (str): The street of the pharmacy.
+            zip_code (str): The zip code of the pharmacy.
+            location (str): The town of the pharmacy.
+            sub_location (str): The district of the pharmacy.
+            phone (str): The phone number of the pharmacy.
+            lat (float): The latitude of the pharmacy in degrees.
+            lon (float): The longitude of the pharmacy in degrees.
+        """
+        self.id = id
+        self.from_date = from_date
+        self.to_date = to_date
+        self.name = name
+        self.street = street
+        self.zip_code = zip_code
+        self.location = location
+        self.sub_location = sub_location
+        self.phone = phone
+        self.lat = lat
+        self.lon = lon
+        self.distance = None
+        self._from_text = None
+        self._to_text = None
+
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Creates a Pharmacy from the text of the child elements of a feed entry.
+
+        Args:
+            fields (dict): The child element texts, keyed by tag name.
+
+        Returns:
+            Pharmacy: The parsed record.
+        """
+        return cls(
+            fields.get("id"),
+            datetime.fromisoformat(fields["from"]),
+            datetime.fromisoformat(fields["to"]),
+            fields.get("name"),
+            fields.get("street"),
+            fields.get("zipCode"),
+            fields.get("location"),
+            fields.get("subLocation"),
+            fields.get("phone"),
+            float(fields["lat"]),
+            float(fields["lon"]),
+        )
+
+    @property
+    def distance_text(self):
+        """
+        The distance to the display location, formatted for the page.
+        """
+        return "" if self.distance is None else f"{self.distance:.1f} km"
+
+    @property
+    def from_text(self):
+        """
+        The start of the service, formatted for the page.
+        """
+        if self._from_text is None:
+            self._from_text = self.from_date.strftime(self.DISPLAY_FORMAT)
+        return self._from_text
+
+    @property
+    def to_text(self):
+        """
+        The end of the service, formatted for the page.
+        """
+        if self._to_text is None:
+            self._to_text = self.to_date.strftime(self.DISPLAY_FORMAT)
+        return self._to_text
+
+    def with_distance(self, distance):
+        """
+        Returns a copy of the record carrying the distance to a display location.
+        """
+        pharmacy = copy.copy(self)
+        pharmacy.distance = distance
+        return pharmacy
+
+    def as_dict(self):
+        """
+        Returns the entry with the field names and value formats of the feed.
+        """
+        return {
+            "id": self.id,
+            "from": self.from_date.isoformat(),
+            "to": self.to_date.isoformat(),
+            "name": self.name,
+            "street": self.street,
+            "zipCode": self.zip_code,
+            "location": self.location,
+            "subLocation": self.sub_location,
+            "phone": self.phone,
+            "lat": self.lat,
+            "lon": self.lon,
+        }
+
+    def __repr__(self):
+        return f"Pharmacy({self.as_dict()!r})"
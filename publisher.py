@@ -0,0 +1,128 @@
+import os
+import logging
+import gzip
+import hashlib
+import tempfile
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 hex digest of a file, or None if it does not exist.
+    """
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path, data):
+    """
+    Writes bytes to a temporary file next to path and moves it into place.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        metrics.cache("write", hit=False)
+        metrics.add_bytes("write", len(data))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _compress(data, encoding):
+    """
+    Compresses bytes with the given encoding ("gz" or "br").
+
+    Returns:
+        bytes: The compressed data, or None if the encoding is not available.
+    """
+    if encoding == "gz":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br":
+        try:
+            import brotli
+        except ImportError:
+            logger.warning("brotli is not installed, skipping the .br file.")
+            return None
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+
+def publish(path, chunks, precompress=()):
+    """
+    Publishes a file atomically, but only if its content has changed.
+
+    The content is streamed into a temporary file in the target directory while
+    it is hashed. If the digest equals the one of the current file, the temporary
+    file is removed unsynced and nothing is touched. Otherwise it is synced to
+    disk and moved over the target with os.replace, so readers (e.g. a web
+    server) always see either the old or the new file, never a truncated one.
+
+    Args:
+        path (str): The path of the published file.
+        chunks (iterable): The content as str (UTF-8 encoded) or bytes chunks.
+        precompress (iterable): Encodings ("gz", "br") of precompressed siblings
+            to write next to the file, e.g. index.html.gz. They are written with a
+            changed file, and whenever they are missing.
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+
+            written = digest.hexdigest() != file_digest(path)
+            if written:
+                # The chunks may be rendered lazily, so only the sync counts as write time
+                with metrics.stage("write"):
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        if written:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+            metrics.cache("write", hit=False)
+            metrics.add_bytes("write", size)
+        else:
+            os.unlink(tmp_path)
+            metrics.cache("write", hit=True)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # A missing sibling is written as well, e.g. after PRECOMPRESS was turned on
+    encodings = [encoding for encoding in precompress
+                 if written or not os.path.exists(f"{path}.{encoding}")]
+    if encodings:
+        with metrics.stage("compress"):
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding in encodings:
+                compressed = _compress(data, encoding)
+                if compressed is not None:
+                    _write_atomic(f"{path}.{encoding}", compressed)
+    return written
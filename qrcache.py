@@ -0,0 +1,129 @@
+import os
+import logging
+import hashlib
+import threading
+from io import BytesIO
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from publisher import publish
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def maps_url(lat, lon):
+    """
+    Returns the Google Maps URL of a location.
+    """
+    return f"https://www.google.com/maps?q={lat},{lon}"
+
+
+def make_qr_code(data, image_format="png"):
+    """
+    Generate a QR Code image for the given data.
+
+    Parameters:
+    data (str): The content of the QR Code, e.g. a URL.
+    image_format (str): "png" or "svg".
+
+    Returns:
+    bytes: The encoded image.
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if image_format == "svg":
+        import qrcode.image.svg
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+class QrCodeCache:
+    """
+    A class used to provide QR codes with the maps link of each pharmacy.
+
+    The images are stored under a hash of their content, so an image is generated
+    only once, no matter how many pages or refreshes use it. Missing images are
+    generated in a worker pool and never block the rendering of a page.
+    """
+
+    def __init__(self, cache_dir, image_format="png", workers=2):
+        """
+        Initializes the QrCodeCache object.
+
+        Args:
+            cache_dir (str): The directory the images are stored in.
+            image_format (str): "png" or "svg" (smaller files).
+            workers (int): The number of threads generating images.
+        """
+        self.cache_dir = cache_dir
+        self.image_format = image_format
+        self._known = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qrcode")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Images generated by an earlier run count as generated at their mtime
+        mtimes = [entry.stat().st_mtime for entry in os.scandir(cache_dir) if entry.is_file()]
+        self.generated_at = datetime.fromtimestamp(max(mtimes), timezone.utc) if mtimes else None
+
+    def filename(self, pharmacy):
+        """
+        Returns the content addressed file name of the QR code of a pharmacy.
+        """
+        url = maps_url(pharmacy.lat, pharmacy.lon)
+        return f"{hashlib.sha256(url.encode()).hexdigest()[:16]}.{self.image_format}"
+
+    def get(self, pharmacy):
+        """
+        Returns the file name of the QR code of a pharmacy, if it already exists.
+        Otherwise its generation is started in the background.
+
+        Args:
+            pharmacy (Pharmacy): The pharmacy.
+
+        Returns:
+            str: The file name within the cache directory, or None if not yet generated.
+        """
+        filename = self.filename(pharmacy)
+        if filename in self._known or os.path.exists(os.path.join(self.cache_dir, filename)):
+            self._known.add(filename)
+            metrics.cache("qr_code", hit=True)
+            return filename
+        metrics.cache("qr_code", hit=False)
+
+        with self._lock:
+            if filename in self._pending:
+                return None
+            self._pending.add(filename)
+        self._executor.submit(self._generate, maps_url(pharmacy.lat, pharmacy.lon), filename)
+        return None
+
+    def _generate(self, url, filename):
+        """
+        Generates and stores one QR code.
+        """
+        try:
+            publish(os.path.join(self.cache_dir, filename), (make_qr_code(url, self.image_format),))
+            self._known.add(filename)
+            self.generated_at = datetime.now(timezone.utc)
+        except Exception as e:
+            logger.error("Failed to generate QR code %s: %s", filename, e)
+        finally:
+            with self._lock:
+                self._pending.discard(filename)
+
+    def close(self):
+        """
+        Waits for the running generations and stops the worker pool.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
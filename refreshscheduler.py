@@ -0,0 +1,131 @@
+import logging
+import random
+import signal
+import threading
+from datetime import datetime, time, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshIncomplete(Exception):
+    """
+    Raised by a refresh that could not bring every feed up to date, so it is
+    retried with backoff. It still carries the next shift boundary of the
+    rosters that are shown.
+    """
+
+    def __init__(self, message, next_boundary=None):
+        super().__init__(message)
+        self.next_boundary = next_boundary
+
+
+class RefreshScheduler:
+    """
+    A class used to run the refresh cycle of a resident notdienst process.
+    """
+
+    def __init__(self, refresh_interval=900, shift_change="08:30", jitter=30,
+                 retry_delay=30, max_backoff=900):
+        """
+        Initializes the RefreshScheduler object.
+
+        Args:
+            refresh_interval (int): The regular delay between two refreshes in seconds.
+            shift_change (str): The daily shift change as "HH:MM", used when the feed
+                does not announce the next boundary itself.
+            jitter (int): The maximum random delay in seconds added to every wait,
+                so that several displays do not hit the API at the same moment.
+            retry_delay (int): The delay in seconds after the first failed refresh.
+            max_backoff (int): The upper limit in seconds for the retry delay.
+        """
+        self.refresh_interval = refresh_interval
+        self.shift_change = time.fromisoformat(shift_change)
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.next_refresh = None
+        self._stop_event = threading.Event()
+
+    def next_shift_change(self, now):
+        """
+        Returns the next daily shift change after the given time.
+
+        Args:
+            now (datetime): The (timezone aware) reference time.
+
+        Returns:
+            datetime: The next shift change.
+        """
+        local_now = now.astimezone()
+        shift_change = local_now.replace(hour=self.shift_change.hour,
+                                         minute=self.shift_change.minute,
+                                         second=0, microsecond=0)
+        if shift_change <= local_now:
+            shift_change += timedelta(days=1)
+        return shift_change
+
+    def next_delay(self, now, next_boundary=None):
+        """
+        Calculates the number of seconds to wait before the next refresh.
+
+        After a failed refresh the delay grows exponentially from retry_delay up to
+        max_backoff, but does not pass the next boundary. Otherwise it is the refresh interval, shortened so that the
+        refresh happens right after the next shift boundary.
+
+        Args:
+            now (datetime): The (timezone aware) reference time.
+            next_boundary (datetime, optional): The next from/to boundary of the feed.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if self.failures:
+            delay = min(self.retry_delay * 2 ** (self.failures - 1), self.max_backoff)
+            if next_boundary is not None and next_boundary > now:
+                delay = min(delay, (next_boundary - now).total_seconds())
+        else:
+            if next_boundary is None or next_boundary <= now:
+                next_boundary = self.next_shift_change(now)
+            delay = min(self.refresh_interval, (next_boundary - now).total_seconds())
+        return max(delay, 0) + random.uniform(0, self.jitter)
+
+    def stop(self, signum=None, frame=None):
+        """
+        Stops the refresh loop. Can be used directly as a signal handler.
+        """
+        if signum is not None:
+            logger.info("Received signal %s, shutting down.", signum)
+        self._stop_event.set()
+
+    def run(self, refresh):
+        """
+        Runs the refresh callable until stop() is called or SIGINT/SIGTERM arrives.
+
+        Args:
+            refresh (callable): The refresh cycle. It may return the datetime of the
+                next shift boundary, so that the next refresh is aligned to it. If it
+                returns None, the last announced boundary is kept. Raising
+                RefreshIncomplete (or any other error) retries it with backoff.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        next_boundary = None
+        while not self._stop_event.is_set():
+            try:
+                next_boundary = refresh() or next_boundary
+                self.failures = 0
+            except RefreshIncomplete as e:
+                next_boundary = e.next_boundary or next_boundary
+                self.failures += 1
+                logger.warning("Refresh incomplete (%d in a row): %s", self.failures, e)
+            except Exception as e:
+                self.failures += 1
+                logger.error("Refresh failed (%d in a row): %s", self.failures, e)
+
+            now = datetime.now(timezone.utc)
+            delay = self.next_delay(now, next_boundary)
+            self.next_refresh = now + timedelta(seconds=delay)
+            logger.info("Next refresh at %s", self.next_refresh.astimezone().strftime("%d.%m.%Y %H:%M:%S"))
+            self._stop_event.wait(delay)
@@ -0,0 +1,165 @@
+import io
+import csv
+import json
+import logging
+from datetime import timezone
+
+from publisher import publish
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("id", "from", "to", "name", "street", "zipCode", "location", "subLocation", "phone",
+          "lat", "lon")
+
+
+def json_chunks(entries):
+    """
+    Yields the entries as a JSON list, one entry per chunk.
+    """
+    yield "["
+    for index, pharmacy in enumerate(entries):
+        yield ("," if index else "") + json.dumps(pharmacy.as_dict(), ensure_ascii=False,
+                                                  separators=(",", ":"))
+    yield "]\n"
+
+
+def csv_chunks(entries):
+    """
+    Yields the entries as CSV with a header row, one row per chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS)
+    writer.writeheader()
+    for pharmacy in entries:
+        writer.writerow(pharmacy.as_dict())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ics_text(value):
+    """
+    Escapes a TEXT value of iCalendar.
+    """
+    return (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,") \
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _ics_time(value):
+    """
+    Formats a timezone aware datetime as iCalendar UTC time.
+    """
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ics_line(line):
+    """
+    Folds a content line after 75 octets, as required by RFC 5545.
+    """
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        # Do not split a multi-byte character
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+    parts.append(data.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_chunks(entries, calendar_name="Notdienst"):
+    """
+    Yields the shifts of the entries as an iCalendar feed, one event per chunk.
+    """
+    yield "".join(map(_ics_line, ("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//notdienst//roster//DE",
+                                  "CALSCALE:GREGORIAN", f"X-WR-CALNAME:{_ics_text(calendar_name)}")))
+    for pharmacy in entries:
+        address = ", ".join(filter(None, (pharmacy.street, " ".join(
+            filter(None, (pharmacy.zip_code, pharmacy.location))))))
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{pharmacy.id}-{_ics_time(pharmacy.from_date)}@notdienst",
+            # The start of the shift instead of the export time, so an unchanged
+            # roster gives an unchanged file
+            f"DTSTAMP:{_ics_time(pharmacy.from_date)}",
+            f"DTSTART:{_ics_time(pharmacy.from_date)}",
+            f"DTEND:{_ics_time(pharmacy.to_date)}",
+            f"SUMMARY:{_ics_text(pharmacy.name)}",
+            f"LOCATION:{_ics_text(address)}",
+            f"GEO:{pharmacy.lat};{pharmacy.lon}",
+        ]
+        if pharmacy.phone:
+            lines.append(f"DESCRIPTION:{_ics_text('Tel. ' + pharmacy.phone)}")
+        lines.append("END:VEVENT")
+        yield "".join(map(_ics_line, lines))
+    yield _ics_line("END:VCALENDAR")
+
+
+FORMATS = {"json": json_chunks, "csv": csv_chunks, "ics": ics_chunks}
+
+
+class RosterExporter:
+    """
+    A class used to export the roster of a site as JSON, CSV and iCalendar files
+    for other consumers (e.g. a phone IVR or a website widget), so they neither
+    scrape the page nor fetch the API themselves.
+
+    Every format is streamed from the parsed roster in memory into its file, the
+    formats concurrently, and each file is only replaced if its content changed.
+    """
+
+    def __init__(self, base_path, formats=tuple(FORMATS), precompress=()):
+        """
+        Initializes the RosterExporter object.
+
+        Args:
+            base_path (str): The path of the files without extension, e.g.
+                data/index-roster for data/index-roster.json.
+            formats (iterable): The formats to export: "json", "csv" and/or "ics".
+            precompress (iterable, optional): Encodings ("gz", "br") of precompressed
+                copies written next to the files.
+        """
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+        self.paths = {name: f"{base_path}.{name}" for name in formats}
+        self.precompress = tuple(precompress)
+        self.exported = False
+
+    def export_format(self, name, entries):
+        """
+        Writes one format of the roster.
+
+        Args:
+            name (str): The format.
+            entries (list): The Pharmacy records of the roster.
+
+        Returns:
+            bool: True if the file was written, False if it was unchanged.
+        """
+        with metrics.stage("export"):
+            written = publish(self.paths[name], FORMATS[name](entries), self.precompress)
+        if written:
+            logger.info("Roster exported to %s", self.paths[name])
+        return written
+
+    def submit(self, entries, executor, wrap=None):
+        """
+        Starts writing all formats of the roster concurrently.
+
+        Args:
+            entries (list): The Pharmacy records of the roster; they are only read.
+            executor (Executor): The pool the formats are written in.
+            wrap (callable, optional): Wraps the write function, e.g. to profile it.
+
+        Returns:
+            list: The futures of the formats, resolving to the result of export_format().
+        """
+        export_format = self.export_format if wrap is None else wrap(self.export_format)
+        return [executor.submit(export_format, name, entries) for name in self.paths]
@@ -0,0 +1,108 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from spatialindex import SpatialIndex
+
+
+class RosterIndex:
+    """
+    An interval index over the service times of the roster.
+
+    The entries are sorted by their start, so "on duty at t", "next shift after t"
+    and "next boundary after t" are answered with a binary search instead of a
+    scan over the whole roster.
+    """
+
+    def __init__(self, pharmacy_list):
+        """
+        Initializes the RosterIndex object.
+
+        Args:
+            pharmacy_list (list): The Pharmacy records of the roster.
+        """
+        self.pharmacy_list = pharmacy_list
+        self._spatial = None
+        self.entries = sorted(pharmacy_list, key=lambda pharmacy: pharmacy.from_date)
+        self.starts = [pharmacy.from_date for pharmacy in self.entries]
+        self.boundaries = sorted({boundary for pharmacy in self.entries
+                                  for boundary in (pharmacy.from_date, pharmacy.to_date)})
+        # An entry active at t started after t - max_duration, which bounds the search
+        self.max_duration = max((pharmacy.to_date - pharmacy.from_date for pharmacy in self.entries),
+                                default=timedelta(0))
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def merge(cls, rosters):
+        """
+        Merges the rosters of several feeds into one.
+
+        An entry listed by several feeds (e.g. a pharmacy at a district border) is
+        kept once; the first roster listing its id wins.
+
+        Args:
+            rosters (iterable): The RosterIndex of every feed.
+
+        Returns:
+            RosterIndex: The merged roster.
+        """
+        entries = {}
+        for roster in rosters:
+            for pharmacy in roster.pharmacy_list:
+                entries.setdefault(pharmacy.id, pharmacy)
+        return cls(list(entries.values()))
+
+    @property
+    def spatial(self):
+        """
+        The grid index over the locations of the roster, built on first use and
+        shared by all sites showing this roster.
+        """
+        # Two sites may build it at the same time, the second result simply wins
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self.pharmacy_list)
+        return self._spatial
+
+    def on_duty(self, t):
+        """
+        Returns the entries on duty at time t (from <= t < to).
+
+        Args:
+            t (datetime): The (timezone aware) time.
+
+        Returns:
+            list: The Pharmacy records on duty, in order of their start.
+        """
+        first = bisect_left(self.starts, t - self.max_duration)
+        last = bisect_right(self.starts, t)
+        return [pharmacy for pharmacy in self.entries[first:last] if pharmacy.to_date > t]
+
+    def next_shift(self, t):
+        """
+        Returns the entries of the first shift starting after time t.
+
+        Args:
+            t (datetime): The (timezone aware) time.
+
+        Returns:
+            list: The Pharmacy records starting next, empty if there is none.
+        """
+        first = bisect_right(self.starts, t)
+        if first == len(self.starts):
+            return []
+        last = bisect_right(self.starts, self.starts[first])
+        return self.entries[first:last]
+
+    def next_boundary(self, t):
+        """
+        Returns the first start or end of a service after time t.
+
+        Args:
+            t (datetime): The (timezone aware) time.
+
+        Returns:
+            datetime: The next boundary, or None if the roster ends before t.
+        """
+        index = bisect_right(self.boundaries, t)
+        return self.boundaries[index] if index < len(self.boundaries) else None
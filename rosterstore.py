@@ -0,0 +1,128 @@
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from pharmacy import Pharmacy
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    api_url TEXT NOT NULL,
+    id TEXT NOT NULL,
+    from_ts TEXT NOT NULL,
+    to_ts TEXT NOT NULL,
+    name TEXT,
+    street TEXT,
+    zip_code TEXT,
+    location TEXT,
+    sub_location TEXT,
+    phone TEXT,
+    lat REAL,
+    lon REAL,
+    digest TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (api_url, id)
+);
+CREATE INDEX IF NOT EXISTS entries_from ON entries (api_url, from_ts);
+CREATE INDEX IF NOT EXISTS entries_to ON entries (api_url, to_ts);
+"""
+
+UPSERT = """
+INSERT INTO entries (api_url, id, from_ts, to_ts, name, street, zip_code, location,
+                     sub_location, phone, lat, lon, digest, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (api_url, id) DO UPDATE SET
+    from_ts = excluded.from_ts, to_ts = excluded.to_ts, name = excluded.name,
+    street = excluded.street, zip_code = excluded.zip_code, location = excluded.location,
+    sub_location = excluded.sub_location, phone = excluded.phone, lat = excluded.lat,
+    lon = excluded.lon, digest = excluded.digest, updated_at = excluded.updated_at
+WHERE entries.digest != excluded.digest
+"""
+
+
+def _timestamp(value):
+    """
+    Returns a datetime as UTC ISO string, so the stored times sort as text.
+    """
+    return value.astimezone(timezone.utc).isoformat()
+
+
+class RosterStore:
+    """
+    A class used to keep the roster of all feeds in a local SQLite database.
+
+    Entries are keyed by their feed and stable id. Each fetch only writes the
+    entries whose content changed, and entries that drop out of the feed are kept
+    as history.
+    """
+
+    def __init__(self, db_file):
+        """
+        Initializes the RosterStore object and creates the schema if needed.
+
+        Args:
+            db_file (str): The path to the SQLite database file.
+        """
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def upsert(self, api_url, pharmacy_list):
+        """
+        Merges the entries of a fetch into the store.
+
+        Args:
+            api_url (str): The URL of the feed the entries come from.
+            pharmacy_list (list): The Pharmacy records of the fetch.
+
+        Returns:
+            int: The number of inserted or changed entries.
+        """
+        api_url = api_url or ""  # TEST_MODE runs without an API_URL
+        updated_at = _timestamp(datetime.now(timezone.utc))
+        rows = []
+        for pharmacy in pharmacy_list:
+            values = (pharmacy.id, _timestamp(pharmacy.from_date), _timestamp(pharmacy.to_date),
+                      pharmacy.name, pharmacy.street, pharmacy.zip_code, pharmacy.location,
+                      pharmacy.sub_location, pharmacy.phone, pharmacy.lat, pharmacy.lon)
+            digest = hashlib.sha256(repr(values).encode()).hexdigest()
+            rows.append((api_url, *values, digest, updated_at))
+
+        with self._lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(UPSERT, rows)
+            return self.connection.total_changes - before
+
+    def load(self, api_url, since=None):
+        """
+        Loads the stored entries of a feed.
+
+        Args:
+            api_url (str): The URL of the feed.
+            since (datetime, optional): Only entries whose service ends after this time.
+
+        Returns:
+            list: The Pharmacy records, in order of their start.
+        """
+        query = ("SELECT id, from_ts, to_ts, name, street, zip_code, location, sub_location,"
+                 " phone, lat, lon FROM entries WHERE api_url = ?")
+        parameters = [api_url or ""]
+        if since is not None:
+            query += " AND to_ts > ?"
+            parameters.append(_timestamp(since))
+        query += " ORDER BY from_ts"
+
+        with self._lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+        return [Pharmacy(id, datetime.fromisoformat(from_ts), datetime.fromisoformat(to_ts), name,
+                         street, zip_code, location, sub_location, phone, lat, lon)
+                for id, from_ts, to_ts, name, street, zip_code, location, sub_location, phone, lat, lon
+                in rows]
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
@@ -0,0 +1,107 @@
+import os
+import json
+
+
+class Site:
+    """
+    A class used to describe one display site: its page, branding and location.
+    """
+
+    def __init__(self, name, html_page, html_title, html_logo_left, html_logo_right,
+                 html_template, api_urls, origin=None, max_rows=None, display_mode="all",
+                 radius_km=None):
+        """
+        Initializes the Site object.
+
+        Args:
+            name (str): A short name of the site, used in the logs.
+            html_page (str): The path to the HTML page of the site.
+            html_title (str): The title of the HTML page.
+            html_logo_left (str): The path to the left logo image.
+            html_logo_right (str): The path to the right logo image.
+            html_template (str): The path to the Jinja2 template.
+            api_urls (tuple): The URLs of the XML API feeds the site shows, merged
+                into one roster if there are several (e.g. neighboring regions).
+            origin (tuple, optional): The (lat, lon) of the display.
+            max_rows (int, optional): The maximum number of pharmacies on the page.
+            display_mode (str, optional): "all" to show the whole roster, "current" to
+                show only the shift on duty and the next one.
+            radius_km (float, optional): Only show the pharmacies within this distance
+                of the origin.
+        """
+        self.name = name
+        self.html_page = html_page
+        self.html_title = html_title
+        self.html_logo_left = html_logo_left
+        self.html_logo_right = html_logo_right
+        self.html_template = html_template
+        self.api_urls = tuple(api_urls)
+        self.origin = origin
+        self.max_rows = max_rows
+        self.display_mode = display_mode
+        self.radius_km = radius_km
+
+    @classmethod
+    def from_settings(cls, settings, defaults=None):
+        """
+        Creates a Site from a settings dictionary that uses the names of the
+        environment variables (HTML_PAGE, LAT_HERE, ...) as keys.
+
+        Args:
+            settings (dict): The settings of the site.
+            defaults (dict, optional): Values for the settings missing in settings.
+
+        Returns:
+            Site: The site.
+        """
+        values = dict(defaults or {})
+        values.update({key: value for key, value in settings.items() if value is not None})
+
+        lat_here = values.get("LAT_HERE")
+        lon_here = values.get("LON_HERE")
+        max_table_rows = values.get("MAX_TABLE_ROWS")
+        # Several feeds are separated by whitespace, or given as a list in a sites file
+        api_urls = values.get("API_URL")
+        if isinstance(api_urls, str):
+            api_urls = api_urls.split() or [None]
+        radius_km = values.get("RADIUS_KM")
+        return cls(
+            name=values.get("NAME") or values.get("HTML_PAGE"),
+            html_page=values.get("HTML_PAGE"),
+            html_title=values.get("HTML_TITLE"),
+            html_logo_left=values.get("HTML_LOGO_LEFT"),
+            html_logo_right=values.get("HTML_LOGO_RIGHT"),
+            html_template=values.get("HTML_TEMPLATE"),
+            api_urls=api_urls or [None],
+            origin=(float(lat_here), float(lon_here)) if lat_here and lon_here else None,
+            max_rows=int(max_table_rows) if max_table_rows else None,
+            display_mode=values.get("DISPLAY_MODE") or "all",
+            radius_km=float(radius_km) if radius_km else None,
+        )
+
+
+SETTING_NAMES = ("HTML_PAGE", "HTML_TITLE", "HTML_LOGO_LEFT", "HTML_LOGO_RIGHT", "HTML_TEMPLATE",
+                 "API_URL", "LAT_HERE", "LON_HERE", "MAX_TABLE_ROWS", "DISPLAY_MODE", "RADIUS_KM")
+
+
+def load_sites(sites_file=None):
+    """
+    Loads the display sites.
+
+    Without a sites file there is a single site configured by the environment
+    variables. A sites file is a JSON list of objects with the same keys as the
+    environment variables (plus an optional NAME); missing keys fall back to the
+    environment.
+
+    Args:
+        sites_file (str, optional): The path to the JSON sites file.
+
+    Returns:
+        list: The Site objects.
+    """
+    defaults = {name: os.getenv(name) for name in SETTING_NAMES}
+    if not sites_file:
+        return [Site.from_settings(defaults)]
+
+    with open(sites_file, "r", encoding="utf-8") as f:
+        return [Site.from_settings(settings, defaults) for settings in json.load(f)]
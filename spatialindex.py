@@ -0,0 +1,160 @@
+import math
+
+from geo import EARTH_RADIUS_KM, haversine_many, select_nearest
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+class SpatialIndex:
+    """
+    A grid index over the locations of the roster.
+
+    The entries are bucketed into cells of about cell_km. A radius query only looks
+    at the cells overlapping the bounding box of the circle, drops the candidates
+    outside the box and calculates exact distances for the rest. A k nearest query
+    grows the radius until it holds k entries. The index does not wrap around the
+    antimeridian.
+    """
+
+    def __init__(self, pharmacy_list, cell_km=10.0):
+        """
+        Initializes the SpatialIndex object.
+
+        Args:
+            pharmacy_list (list): The Pharmacy records of the roster.
+            cell_km (float): The edge length of the grid cells in kilometers.
+        """
+        import numpy as np
+
+        self.pharmacy_list = pharmacy_list
+        self.cell_km = cell_km
+        self.lats = np.fromiter((pharmacy.lat for pharmacy in pharmacy_list), dtype=float,
+                                count=len(pharmacy_list))
+        self.lons = np.fromiter((pharmacy.lon for pharmacy in pharmacy_list), dtype=float,
+                                count=len(pharmacy_list))
+
+        # Cells are cell_km high and, at the mean latitude, cell_km wide
+        mean_lat = float(self.lats.mean()) if len(pharmacy_list) else 0.0
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = self.lat_step / max(math.cos(math.radians(mean_lat)), 0.01)
+
+        cells = {}
+        for index, cell in enumerate(zip(np.floor(self.lats / self.lat_step).astype(int).tolist(),
+                                         np.floor(self.lons / self.lon_step).astype(int).tolist())):
+            cells.setdefault(cell, []).append(index)
+        self.cells = {cell: np.array(indices, dtype=int) for cell, indices in cells.items()}
+
+    def __len__(self):
+        return len(self.pharmacy_list)
+
+    @staticmethod
+    def bounding_box(lat, lon, radius_km):
+        """
+        Returns the (min lat, max lat, min lon, max lon) in degrees that encloses all
+        points within radius_km of (lat, lon).
+        """
+        angular_radius = radius_km / EARTH_RADIUS_KM
+        delta_lat = math.degrees(angular_radius)
+        if abs(lat) + delta_lat >= 90 or math.sin(angular_radius) >= math.cos(math.radians(lat)):
+            # The circle contains a pole, so every longitude can be reached
+            return lat - delta_lat, lat + delta_lat, -180.0, 180.0
+        delta_lon = math.degrees(math.asin(math.sin(angular_radius) / math.cos(math.radians(lat))))
+        return lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon
+
+    def _candidates(self, lat, lon, radius_km):
+        """
+        Returns the indices and distances of the entries within radius_km of (lat, lon).
+        """
+        import numpy as np
+
+        min_lat, max_lat, min_lon, max_lon = self.bounding_box(lat, lon, radius_km)
+        rows = range(math.floor(min_lat / self.lat_step), math.floor(max_lat / self.lat_step) + 1)
+        columns = range(math.floor(min_lon / self.lon_step), math.floor(max_lon / self.lon_step) + 1)
+        if len(rows) * len(columns) > len(self.cells):
+            # A huge circle, looking at the occupied cells is cheaper
+            buckets = [indices for (row, column), indices in self.cells.items()
+                       if row in rows and column in columns]
+        else:
+            buckets = [self.cells[cell] for cell in ((row, column) for row in rows for column in columns)
+                       if cell in self.cells]
+        if not buckets:
+            return np.empty(0, dtype=int), np.empty(0)
+
+        indices = np.concatenate(buckets)
+        lats, lons = self.lats[indices], self.lons[indices]
+        in_box = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        indices = indices[in_box]
+
+        distances = haversine_many(lat, lon, self.lats[indices], self.lons[indices])
+        within = distances <= radius_km
+        return indices[within], distances[within]
+
+    def _records(self, indices, distances, max_rows=None):
+        """
+        Returns the records of the indices as copies carrying their distance, nearest first.
+        """
+        return [self.pharmacy_list[indices[index]].with_distance(float(distances[index]))
+                for index in select_nearest(distances, max_rows)]
+
+    def within(self, lat, lon, radius_km, max_rows=None):
+        """
+        Returns the pharmacies within radius_km of a location.
+
+        Args:
+            lat (float): Latitude of the location in degrees.
+            lon (float): Longitude of the location in degrees.
+            radius_km (float): The radius in kilometers.
+            max_rows (int, optional): The number of pharmacies to return at most.
+
+        Returns:
+            list: The Pharmacy records as copies carrying the distance, nearest first.
+        """
+        indices, distances = self._candidates(lat, lon, radius_km)
+        return self._records(indices, distances, max_rows)
+
+    def nearest(self, lat, lon, k):
+        """
+        Returns the k pharmacies nearest to a location.
+
+        Args:
+            lat (float): Latitude of the location in degrees.
+            lon (float): Longitude of the location in degrees.
+            k (int): The number of pharmacies to return.
+
+        Returns:
+            list: The Pharmacy records as copies carrying the distance, nearest first.
+        """
+        radius_km = self.cell_km
+        while True:
+            indices, distances = self._candidates(lat, lon, radius_km)
+            # Half the circumference reaches every point of the earth
+            if len(indices) >= k or radius_km >= math.pi * EARTH_RADIUS_KM:
+                return self._records(indices, distances, k)
+            radius_km *= 2
+
+    def within_many(self, origins, radius_km, max_rows=None):
+        """
+        Answers a radius query for each of many locations.
+
+        Args:
+            origins (iterable): The (lat, lon) of the locations.
+            radius_km (float): The radius in kilometers.
+            max_rows (int, optional): The number of pharmacies per location at most.
+
+        Returns:
+            list: The result of within() for each location.
+        """
+        return [self.within(lat, lon, radius_km, max_rows) for lat, lon in origins]
+
+    def nearest_many(self, origins, k):
+        """
+        Answers a k nearest query for each of many locations.
+
+        Args:
+            origins (iterable): The (lat, lon) of the locations.
+            k (int): The number of pharmacies per location.
+
+        Returns:
+            list: The result of nearest() for each location.
+        """
+        return [self.nearest(lat, lon, k) for lat, lon in origins]
@@ -1,13 +1,9 @@
 #!/bin/bash
 
 cd ~/dev/notdienst
-# cd html
-python -m http.server -d . -b 0.0.0.0 8080
 
-# cd ..
 source ./.venv/bin/activate
 
-while true; do
-    python notdienst.py
-    # sleep 900 # Sleep for 5 minutes (300 seconds)
-done
+# notdienst.py stays resident, refreshes on its own schedule and serves the
+# display pages itself (instead of python -m http.server -d . -b 0.0.0.0 8080)
+DAEMON_MODE=True SERVER_MODE=True SERVER_PORT=8080 python notdienst.py
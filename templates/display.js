@@ -0,0 +1,59 @@
+function updateTime() {
+  const currentTime = new Date();
+  const options = { weekday: 'long', year: 'numeric', month: 'long', day: 'numeric', hour: 'numeric', minute: 'numeric' };
+
+  const timeString = currentTime.toLocaleString('de-DE', options);
+  document.getElementById('time-display').textContent = timeString;
+}
+
+setInterval(updateTime, 1000); // Update the time every second
+
+// Poll the roster data and replace the table rows only when the roster changed
+const roster = document.getElementById('roster');
+let etag = null;
+let lastModified = null;
+
+function createRow(columns, values) {
+  const row = document.createElement('tr');
+  values.forEach((value, index) => {
+    const cell = document.createElement('td');
+    if (columns[index] === 'qr_code') {
+      if (value) {
+        const image = document.createElement('img');
+        image.className = 'qr_code';
+        image.src = value;
+        image.alt = 'QR Code';
+        cell.appendChild(image);
+      }
+    } else {
+      cell.textContent = value === null ? '' : value;
+    }
+    row.appendChild(cell);
+  });
+  return row;
+}
+
+async function updateRoster() {
+  const headers = {};
+  if (etag) headers['If-None-Match'] = etag;
+  if (lastModified) headers['If-Modified-Since'] = lastModified;
+  try {
+    const response = await fetch(roster.dataset.src, { cache: 'no-store', headers: headers });
+    if (response.status !== 200) return; // 304: nothing changed
+    etag = response.headers.get('ETag');
+    lastModified = response.headers.get('Last-Modified');
+    const data = await response.json();
+    document.getElementById('generated-at').textContent = data.generated_at;
+    if (data.version === roster.dataset.version) return;
+    if (data.columns.join(',') !== roster.dataset.columns) {
+      location.reload(); // The table header changed as well
+      return;
+    }
+    roster.replaceChildren(...data.rows.map(values => createRow(data.columns, values)));
+    roster.dataset.version = data.version;
+  } catch (error) {
+    // Keep the shown roster and try again with the next poll
+  }
+}
+
+setInterval(updateRoster, 60000); // Check for a new roster every minute
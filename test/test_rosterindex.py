@@ -0,0 +1,65 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from pharmacy import Pharmacy
+from rosterindex import RosterIndex
+
+START = datetime(2024, 11, 1, 8, tzinfo=timezone.utc)
+
+
+def make_roster(count=60, seed=1):
+    """
+    Returns random, partly overlapping and partly identical shifts.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for index in range(count):
+        from_date = START + timedelta(hours=rng.choice((0, 12, 24)) * rng.randrange(10))
+        to_date = from_date + timedelta(hours=rng.choice((12, 24, 36)))
+        entries.append(Pharmacy(str(index), from_date, to_date, f"Apotheke {index}", None, None,
+                                None, None, None, 50.0, 8.0))
+    return entries
+
+
+def probe_times(entries):
+    """
+    Returns every boundary, the moments just around it and times outside the roster.
+    """
+    times = {START - timedelta(days=1), START + timedelta(days=30)}
+    for pharmacy in entries:
+        for boundary in (pharmacy.from_date, pharmacy.to_date):
+            times.update((boundary - timedelta(seconds=1), boundary, boundary + timedelta(seconds=1)))
+    return sorted(times)
+
+
+def test_on_duty_matches_scan():
+    entries = make_roster()
+    roster = RosterIndex(entries)
+    for t in probe_times(entries):
+        expected = {pharmacy.id for pharmacy in entries if pharmacy.from_date <= t < pharmacy.to_date}
+        assert {pharmacy.id for pharmacy in roster.on_duty(t)} == expected
+
+
+def test_next_shift_matches_scan():
+    entries = make_roster()
+    roster = RosterIndex(entries)
+    for t in probe_times(entries):
+        later = [pharmacy.from_date for pharmacy in entries if pharmacy.from_date > t]
+        expected = {pharmacy.id for pharmacy in entries if later and pharmacy.from_date == min(later)}
+        assert {pharmacy.id for pharmacy in roster.next_shift(t)} == expected
+
+
+def test_next_boundary_matches_scan():
+    entries = make_roster()
+    roster = RosterIndex(entries)
+    for t in probe_times(entries):
+        later = [boundary for pharmacy in entries for boundary in (pharmacy.from_date, pharmacy.to_date)
+                 if boundary > t]
+        assert roster.next_boundary(t) == (min(later) if later else None)
+
+
+def test_empty_roster():
+    roster = RosterIndex([])
+    assert roster.on_duty(START) == []
+    assert roster.next_shift(START) == []
+    assert roster.next_boundary(START) is None
@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from geo import haversine_many, nearest_pharmacies
+from pharmacy import Pharmacy
+from spatialindex import SpatialIndex
+
+SHIFT = datetime(2024, 11, 1, 8, tzinfo=timezone.utc)
+ORIGINS = [(50.1, 8.7), (49.0, 7.0), (52.5, 13.4), (0.0, 0.0)]
+
+
+def make_pharmacies(count=300, seed=1):
+    """
+    Returns pharmacies spread over Germany, with a few sharing one location.
+    """
+    rng = random.Random(seed)
+    pharmacies = [Pharmacy(str(index), SHIFT, SHIFT, f"Apotheke {index}", None, None, None, None,
+                           None, rng.uniform(47.5, 54.5), rng.uniform(6.0, 15.0))
+                  for index in range(count)]
+    for index in range(5):
+        pharmacies.append(Pharmacy(f"twin{index}", SHIFT, SHIFT, "Apotheke", None, None, None, None,
+                                   None, 50.1, 8.7))
+    return pharmacies
+
+
+def scan(pharmacies, lat, lon):
+    """
+    Returns (distance, id) of every pharmacy, nearest first.
+    """
+    distances = haversine_many(lat, lon, [pharmacy.lat for pharmacy in pharmacies],
+                               [pharmacy.lon for pharmacy in pharmacies])
+    return sorted(zip(distances.tolist(), (pharmacy.id for pharmacy in pharmacies)))
+
+
+@pytest.mark.parametrize("radius_km", [0.0, 5.0, 40.0, 250.0, 2000.0])
+def test_within_matches_scan(radius_km):
+    pharmacies = make_pharmacies()
+    index = SpatialIndex(pharmacies)
+    for lat, lon in ORIGINS:
+        expected = [(distance, id) for distance, id in scan(pharmacies, lat, lon) if distance <= radius_km]
+        result = index.within(lat, lon, radius_km)
+        assert sorted(pharmacy.id for pharmacy in result) == sorted(id for _, id in expected)
+        assert [pharmacy.distance for pharmacy in result] == pytest.approx([d for d, _ in expected])
+
+
+@pytest.mark.parametrize("max_rows", [0, 1, 3, 10])
+def test_within_max_rows(max_rows):
+    pharmacies = make_pharmacies()
+    index = SpatialIndex(pharmacies)
+    for lat, lon in ORIGINS:
+        expected = [distance for distance, _ in scan(pharmacies, lat, lon) if distance <= 100.0]
+        result = index.within(lat, lon, 100.0, max_rows)
+        assert [pharmacy.distance for pharmacy in result] == pytest.approx(expected[:max_rows])
+
+
+@pytest.mark.parametrize("k", [1, 5, 20, 400])
+def test_nearest_matches_scan(k):
+    pharmacies = make_pharmacies()
+    index = SpatialIndex(pharmacies)
+    for lat, lon in ORIGINS:
+        expected = scan(pharmacies, lat, lon)[:k]
+        result = index.nearest(lat, lon, k)
+        assert [pharmacy.distance for pharmacy in result] == pytest.approx([d for d, _ in expected])
+
+
+@pytest.mark.parametrize("max_rows", [None, 0, 1, 20])
+def test_nearest_pharmacies_matches_scan(max_rows):
+    pharmacies = make_pharmacies()
+    for lat, lon in ORIGINS:
+        expected = scan(pharmacies, lat, lon)[:max_rows]
+        result = nearest_pharmacies(pharmacies, lat, lon, max_rows)
+        assert [pharmacy.distance for pharmacy in result] == pytest.approx([d for d, _ in expected])
+
+
+def test_records_are_copies():
+    pharmacies = make_pharmacies(10)
+    result = SpatialIndex(pharmacies).nearest(50.1, 8.7, 3)
+    assert all(pharmacy.distance is None for pharmacy in pharmacies)
+    assert all(pharmacy.distance is not None for pharmacy in result)
+
+
+def test_empty_index():
+    index = SpatialIndex([])
+    assert index.within(50.1, 8.7, 10.0) == []
+    assert index.nearest(50.1, 8.7, 3) == []